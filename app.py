@@ -1,34 +1,99 @@
 # Importación de librerías necesarias
 import os
 import csv
+import json
+import threading
+import time
 from flask import (
-    Flask, request, render_template, redirect,
-    url_for, flash, session, send_file
+    Flask, Request, request, render_template, redirect,
+    url_for, flash, session,
+    jsonify, Response, stream_with_context
 )
-from flask import make_response
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from io import StringIO, BytesIO
 
 # Se importan funciones desde el archivo principal (main.py)
 from main import (
-    procesar_factura, despachar_parser,
-    conectar_sqlserver, insertar_factura,
-    buscar_facturas_por_cuil  # Nueva función para búsqueda por CUIL
+    extraer_datos_factura,
+    conectar_sqlserver, insertar_facturas_lote,
+    buscar_facturas_paginado, decodificar_cursor, buscar_resumen_gastos,
+    ejecutar_busqueda_por_cuil, iterar_bloques
 )
+from utils.cache_ocr import obtener_cache
+from utils.trabajos import ColaTrabajos
+from utils.pool_conexiones import PoolConexiones
+from utils.metricas import REGISTRO, exportar_valor
+from utils.referencias import REFERENCIAS
+from utils.pdf_utils import PDFEnMemoria
 
-# Se define la carpeta donde se van a guardar los archivos subidos
-UPLOAD_FOLDER = 'uploads'
 # Se permite únicamente archivos con extensión .pdf
 ALLOWED_EXTENSIONS = {'pdf'}
+# Tamaño máximo (en MB) de una carga completa y de cada archivo, y cantidad máxima de archivos por carga
+TAMANO_MAXIMO_CARGA_MB = int(os.environ.get('FACTURAI_MAX_CARGA_MB', '50'))
+TAMANO_MAXIMO_ARCHIVO_MB = int(os.environ.get('FACTURAI_MAX_ARCHIVO_MB', '10'))
+MAXIMO_ARCHIVOS = int(os.environ.get('FACTURAI_MAX_ARCHIVOS', '50'))
+# Si está activo, se leen primero los códigos de barras y el OCR se aplica solo cuando faltan campos
+MODO_RAPIDO = os.environ.get('FACTURAI_MODO_RAPIDO', '0') == '1'
+# Cantidad de archivos que se procesan en paralelo en segundo plano
+WORKERS_PROCESAMIENTO = int(os.environ.get('FACTURAI_WORKERS', '4'))
+# Tamaño del pool de conexiones a la base y segundos máximos de espera por una conexión
+TAMANO_POOL = int(os.environ.get('FACTURAI_POOL', '5'))
+TIMEOUT_POOL = float(os.environ.get('FACTURAI_POOL_TIMEOUT', '10'))
+# Cantidad de facturas por página en la búsqueda (por defecto y máxima)
+TAMANO_PAGINA = 50
+TAMANO_PAGINA_MAXIMO = 500
+# Cantidad de filas que se leen de la base por cada bloque del CSV descargable
+TAMANO_BLOQUE_CSV = 500
+# Los resultados de cada carga se guardan en el servidor (la cookie de sesión solo lleva el id del trabajo):
+# segundos que se conservan desde la última consulta y cantidad máxima de trabajos guardados
+TTL_RESULTADOS = float(os.environ.get('FACTURAI_TTL_RESULTADOS', '3600'))
+MAXIMO_TRABAJOS = int(os.environ.get('FACTURAI_MAX_TRABAJOS', '200'))
+# Segundos entre intentos de leer el índice de códigos de barras si la base no estaba disponible
+REINTENTO_REFERENCIAS = float(os.environ.get('FACTURAI_REINTENTO_INDICE', '60'))
+
+# Los archivos subidos se reciben en memoria y se procesan sin guardarlos en disco. Werkzeug vuelca a un
+# archivo temporal los que superan los 500 KB; como el tamaño de la carga está acotado por
+# MAX_CONTENT_LENGTH, no hace falta
+class SolicitudEnMemoria(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return BytesIO()
 
 # Se configura la aplicación Flask
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.request_class = SolicitudEnMemoria
+app.config['MAX_CONTENT_LENGTH'] = TAMANO_MAXIMO_CARGA_MB * 1024 * 1024
 app.secret_key = 'tu_clave_secreta'  # Clave para mantener la sesión
 
-# Si no existe la carpeta de uploads, se crea
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Pool de conexiones compartido por todas las rutas
+pool = PoolConexiones(conectar_sqlserver, tamano=TAMANO_POOL, timeout=TIMEOUT_POOL)
+
+# Entidades y códigos de barras ya cargados, para descartar duplicados antes del OCR. El índice se lee
+# la primera vez que se procesa un archivo, no al importar el módulo
+_carga_referencias = threading.Lock()
+_ultimo_intento_referencias = None
+
+# Esta función lee el índice si todavía no está cargado. Si la base no está disponible se vuelve a intentar
+# pasados REINTENTO_REFERENCIAS segundos; mientras tanto los duplicados se detectan igual al insertar
+def asegurar_referencias():
+    global _ultimo_intento_referencias
+    if REFERENCIAS.cargadas:
+        return
+    # Si otro hilo ya lo está leyendo, este sigue sin esperar
+    if not _carga_referencias.acquire(blocking=False):
+        return
+    try:
+        ahora = time.monotonic()
+        if REFERENCIAS.cargadas or (_ultimo_intento_referencias is not None
+                                    and ahora - _ultimo_intento_referencias < REINTENTO_REFERENCIAS):
+            return
+        _ultimo_intento_referencias = ahora
+        with pool.conexion() as conn:
+            REFERENCIAS.cargar(conn)
+    except Exception as e:
+        print(f"No se pudo cargar el índice de códigos de barras: {e}")
+    finally:
+        _carga_referencias.release()
 
 # Función auxiliar para validar que el archivo tenga una extensión permitida
 def allowed_file(filename):
@@ -37,9 +102,53 @@ def allowed_file(filename):
 # Ruta principal: muestra el formulario de carga
 @app.route('/', methods=['GET'])
 def index():
-    return render_template('index.html')
+    return render_template(
+        'index.html', maximo_archivos=MAXIMO_ARCHIVOS,
+        maximo_archivo_mb=TAMANO_MAXIMO_ARCHIVO_MB, maximo_carga_mb=TAMANO_MAXIMO_CARGA_MB
+    )
+
+# Esta función responde a una carga que supera MAX_CONTENT_LENGTH
+@app.errorhandler(RequestEntityTooLarge)
+def carga_demasiado_grande(e):
+    mensaje = f'La carga supera el máximo de {TAMANO_MAXIMO_CARGA_MB} MB.'
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'error': mensaje}), 413
+    flash(mensaje)
+    return redirect(url_for('index'))
+
+# Esta función procesa un archivo subido en segundo plano y devuelve su resultado (sin insertarlo)
+def procesar_archivo(tarea):
+    pdf, cuil = tarea
+    asegurar_referencias()
+    try:
+        # Se extrae el texto del PDF (desde memoria) y se analiza el contenido
+        datos, ruta = extraer_datos_factura(pdf, rapido=MODO_RAPIDO, cache=obtener_cache())
+        datos['archivo'] = pdf.nombre
+        datos['cuil'] = cuil
+        return {'archivo': pdf.nombre, 'datos': datos, 'ruta': ruta}
+    except Exception as e:
+        return {'archivo': pdf.nombre, 'error': str(e)}
+
+# Esta función inserta en la base, en un solo lote, los resultados que ya terminaron de procesarse
+def cargar_resultados(resultados):
+    with pool.conexion() as conn:
+        insertadas, duplicadas, errores = insertar_facturas_lote(conn, [r['datos'] for r in resultados])
+
+    finales = list(resultados)
+    for orden in duplicadas:
+        finales[orden] = {
+            'archivo': resultados[orden]['archivo'],
+            'error': f"La factura con código {resultados[orden]['datos']['codigo_barra']} ya fue cargada previamente."
+        }
+    for orden, error in errores:
+        finales[orden] = {'archivo': resultados[orden]['archivo'], 'error': error}
+    return finales
 
-# Ruta para procesar los archivos subidos
+# Cola de trabajos en segundo plano para /procesar
+cola_trabajos = ColaTrabajos(max_workers=WORKERS_PROCESAMIENTO, escribir=cargar_resultados,
+                             ttl=TTL_RESULTADOS, maximo_trabajos=MAXIMO_TRABAJOS)
+
+# Ruta para procesar los archivos subidos: los encola y responde enseguida con el id del trabajo
 @app.route('/procesar', methods=['POST'])
 def procesar():
     # Se valida que se hayan subido archivos
@@ -50,124 +159,143 @@ def procesar():
     # Se obtiene el CUIL ingresado por el usuario
     cuil = request.form.get('cuil')
     files = request.files.getlist('files[]')  # Lista de archivos subidos
-    resultados = []
-    primer_cuil_extraido = None  # Para guardar el primer CUIL extraído desde el archivo
+    tareas = []
 
-    try:
-        with conectar_sqlserver() as conn:
-            cursor = conn.cursor()
+    if len(files) > MAXIMO_ARCHIVOS:
+        mensaje = f'Se pueden subir hasta {MAXIMO_ARCHIVOS} archivos por vez.'
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'error': mensaje}), 400
+        flash(mensaje)
+        return redirect(url_for('index'))
 
-            for file in files:
-                # Validación del archivo y guardado temporal
-                if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-
-                    try:
-                        # Se extrae el texto del PDF y se analiza el contenido
-                        texto, imagen_cv, codigos = procesar_factura(filepath)
-                        datos = despachar_parser(filename, texto, codigos)
-                        datos['archivo'] = filename
-                        datos['cuil'] = cuil
-
-                        # Se guarda el primer CUIL extraído, si no estaba definido aún
-                        if not primer_cuil_extraido and datos.get('cuil'):
-                            primer_cuil_extraido = datos['cuil']
-
-                        # Inserta los datos en la base de datos si no existe previamente
-                        inserted = insertar_factura(cursor, datos)
-                        if inserted:
-                            conn.commit()
-                            resultados.append({'archivo': filename, 'datos': datos})
-                        else:
-                            resultados.append({
-                                'archivo': filename,
-                                'error': f"La factura con código {datos['codigo_barra']} ya fue cargada previamente."
-                            })
-                    except Exception as e:
-                        resultados.append({'archivo': filename, 'error': str(e)})
-
-                    # Borra el archivo después de procesarlo
-                    try:
-                        os.remove(filepath)
-                    except Exception as e:
-                        print(f"Error al eliminar el archivo {filepath}: {e}")
-                else:
-                    resultados.append({'archivo': file.filename, 'error': 'Formato no permitido'})
+    for file in files:
+        # Validación del archivo; el contenido queda en memoria y se procesa después de responder
+        if not (file and allowed_file(file.filename)):
+            tareas.append({'archivo': file.filename, 'error': 'Formato no permitido'})
+            continue
+        pdf = PDFEnMemoria.desde_stream(file.stream, secure_filename(file.filename))
+        if len(pdf.contenido) > TAMANO_MAXIMO_ARCHIVO_MB * 1024 * 1024:
+            tareas.append({'archivo': pdf.nombre, 'error': f'El archivo supera los {TAMANO_MAXIMO_ARCHIVO_MB} MB'})
+        elif not pdf.es_pdf():
+            tareas.append({'archivo': pdf.nombre, 'error': 'Formato no permitido'})
+        else:
+            tareas.append((pdf, cuil))
 
-    except Exception as e:
-        flash(f'Error al conectar con la base de datos: {e}')
-        return redirect(url_for('index'))
+    trabajo = cola_trabajos.encolar(tareas, procesar_archivo, cuil)
+
+    # Se guarda en la sesión solo el id del trabajo y el CUIL
+    session['trabajo_id'] = trabajo.id
+    session['cuil'] = cuil
+
+    # Los clientes que piden JSON reciben el id del trabajo; el formulario va a la vista de resultados
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'trabajo_id': trabajo.id, 'total': trabajo.total}), 202
+    return redirect(url_for('resultados', trabajo_id=trabajo.id))
+
+# Esta función devuelve el trabajo pedido por parámetro o, si no se indica, el último de la sesión
+def trabajo_actual():
+    trabajo_id = request.args.get('trabajo_id') or session.get('trabajo_id')
+    return cola_trabajos.obtener(trabajo_id) if trabajo_id else None
+
+# Ruta para consultar el estado de un trabajo en formato JSON
+@app.route('/trabajos/<trabajo_id>', methods=['GET'])
+def estado_trabajo(trabajo_id):
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo inexistente'}), 404
+    return jsonify(trabajo.estado())
+
+# Ruta que transmite el avance de un trabajo con server-sent events, un evento por archivo terminado
+@app.route('/trabajos/<trabajo_id>/eventos', methods=['GET'])
+def eventos_trabajo(trabajo_id):
+    trabajo = cola_trabajos.obtener(trabajo_id)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo inexistente'}), 404
 
-    # Se guardan los resultados y el CUIL extraído en la sesión
-    session['resultados'] = resultados
-    session['cuil'] = primer_cuil_extraido or cuil
+    def generar():
+        enviados = 0
+        while True:
+            nuevos = trabajo.esperar_nuevos(enviados)
+            for resultado in nuevos:
+                yield f"data: {json.dumps(resultado, default=str)}\n\n"
+            enviados += len(nuevos)
+            if enviados >= trabajo.total:
+                yield "event: fin\ndata: {}\n\n"
+                return
+            if not nuevos:
+                # Comentario SSE para que los proxies no corten la conexión inactiva
+                yield ": esperando\n\n"
 
-    # Redirecciona a la vista de resultados
-    return redirect(url_for('resultados'))
+    response = Response(stream_with_context(generar()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
-# Ruta para mostrar los resultados luego del procesamiento
+# Ruta para mostrar los resultados; se completan a medida que el trabajo avanza
 @app.route('/resultados', methods=['GET'])
 def resultados():
-    resultados = session.get('resultados')
+    trabajo = trabajo_actual()
     cuil = session.get('cuil')
-    if not resultados:
+    if not trabajo:
         flash("No hay resultados disponibles.")
         return redirect(url_for('index'))
-    return render_template('resultados.html', resultados=resultados, cuil=cuil)
+    return render_template(
+        'resultados.html',
+        resultados=trabajo.resultados_ordenados(),
+        cuil=trabajo.cuil or cuil,
+        trabajo=trabajo
+    )
 
 # Ruta para descargar los resultados procesados en formato CSV
 @app.route('/descargar_csv')
 def descargar_csv():
-    resultados = session.get('resultados')
+    trabajo = trabajo_actual()
+    resultados = trabajo.resultados_ordenados() if trabajo else None
     if not resultados:
         flash("No hay resultados para descargar.")
         return redirect(url_for('index'))
 
-    # Se crea un CSV en memoria con los datos procesados
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow([
-        'Archivo', 'Entidad', 'Código de barra', 'Cliente', 'Monto',
-        'Vencimiento', 'Periodo', 'Condición IVA', 'CUIL', 'Estado'
-    ])
-
-    for r in resultados:
-        if 'error' in r:
-            continue
-        datos = r['datos']
-        entidad = {
-            1: 'Edesur',
-            2: 'Metrogas',
-            3: 'Movistar'
-        }.get(datos.get('entidad_id'), 'Desconocida')
-
+    # Se genera el CSV fila por fila a partir de los resultados guardados en el servidor
+    def generar():
+        si = StringIO()
+        writer = csv.writer(si)
         writer.writerow([
-            r['archivo'],
-            entidad,
-            datos.get('codigo_barra', ''),
-            datos.get('cliente', ''),
-            datos.get('monto', ''),
-            datos.get('vencimiento', ''),
-            datos.get('periodo', ''),
-            datos.get('condicion_iva', ''),
-            datos.get('cuil', ''),
-            'Procesado'
+            'Archivo', 'Entidad', 'Código de barra', 'Cliente', 'Monto',
+            'Vencimiento', 'Periodo', 'Condición IVA', 'CUIL', 'Estado'
         ])
 
-    # Se convierte el CSV a un archivo descargable
-    output = BytesIO()
-    output.write(si.getvalue().encode('utf-8'))
-    output.seek(0)
-    si.close()
-
-    return send_file(
-        output,
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name='facturas_procesadas.csv'
-    )
+        for r in resultados:
+            if 'error' in r:
+                continue
+            datos = r['datos']
+            entidad = {
+                1: 'Edesur',
+                2: 'Metrogas',
+                3: 'Movistar'
+            }.get(datos.get('entidad_id'), 'Desconocida')
+
+            writer.writerow([
+                r['archivo'],
+                entidad,
+                datos.get('codigo_barra', ''),
+                datos.get('cliente', ''),
+                datos.get('monto', ''),
+                datos.get('vencimiento', ''),
+                datos.get('periodo', ''),
+                datos.get('condicion_iva', ''),
+                datos.get('cuil', ''),
+                'Procesado'
+            ])
+            yield si.getvalue()
+            si.seek(0)
+            si.truncate(0)
+        yield si.getvalue()
+
+    # Se devuelve como archivo descargable
+    response = Response(generar(), mimetype='text/csv')
+    response.headers["Content-Disposition"] = "attachment; filename=facturas_procesadas.csv"
+    response.headers["Content-type"] = "text/csv; charset=utf-8"
+    return response
 
 # Ruta para buscar facturas previamente procesadas, filtrando por CUIL (y opcionalmente por entidad)
 @app.route('/buscar_facturas', methods=['GET'])
@@ -179,18 +307,66 @@ def buscar_facturas():
         flash("Debe ingresar un CUIL para buscar.")
         return redirect(url_for('index'))
 
+    # Parámetros de paginación: tamaño de página, orden por vencimiento y cursor de la página anterior
+    orden = 'asc' if request.args.get('orden') == 'asc' else 'desc'
+    despues = request.args.get('despues')
+    try:
+        tamano = min(max(int(request.args.get('tamano', TAMANO_PAGINA)), 1), TAMANO_PAGINA_MAXIMO)
+    except ValueError:
+        tamano = TAMANO_PAGINA
+
+    # El cursor se valida antes de pedir una conexión
+    if despues:
+        try:
+            decodificar_cursor(despues)
+        except ValueError:
+            flash("El cursor de paginación no es válido.")
+            return redirect(url_for('index'))
+
     try:
-        with conectar_sqlserver() as conn:
+        with pool.conexion() as conn:
             cursor = conn.cursor()
-            facturas = buscar_facturas_por_cuil(cursor, cuil, entidad_id if entidad_id else None)
+            facturas, siguiente = buscar_facturas_paginado(
+                cursor, cuil, entidad_id if entidad_id else None,
+                tamano_pagina=tamano, orden=orden, despues=despues
+            )
             if not facturas:
                 flash(f"No se encontraron facturas para el CUIL: {cuil}")
                 return redirect(url_for('index'))
-            return render_template('buscar_facturas.html', facturas=facturas, cuil=cuil)
+            return render_template(
+                'buscar_facturas.html', facturas=facturas, cuil=cuil,
+                siguiente=siguiente, orden=orden, tamano=tamano, entidad_id=entidad_id
+            )
     except Exception as e:
         flash(f"Error al buscar facturas: {e}")
         return redirect(url_for('index'))
 
+# Ruta que muestra el resumen de gastos de un CUIL por entidad y período (o lo devuelve en JSON)
+@app.route('/resumen', methods=['GET'])
+def resumen_gastos():
+    cuil = request.args.get('cuil')
+    entidad_id = request.args.get('entidad_id')
+    quiere_json = request.accept_mimetypes.best == 'application/json'
+
+    if not cuil:
+        if quiere_json:
+            return jsonify({'error': 'Debe indicar un CUIL.'}), 400
+        flash("Debe ingresar un CUIL para ver el resumen.")
+        return redirect(url_for('index'))
+
+    try:
+        with pool.conexion() as conn:
+            resumen = buscar_resumen_gastos(conn.cursor(), cuil, entidad_id if entidad_id else None)
+    except Exception as e:
+        if quiere_json:
+            return jsonify({'error': str(e)}), 500
+        flash(f"Error al obtener el resumen: {e}")
+        return redirect(url_for('index'))
+
+    if quiere_json:
+        return Response(json.dumps({'cuil': cuil, 'resumen': resumen}, default=str), mimetype='application/json')
+    return render_template('resumen.html', resumen=resumen, cuil=cuil, entidad_id=entidad_id)
+
 # Ruta para descargar las facturas previamente consultadas desde la base de datos
 @app.route('/descargar_facturas', methods=['GET'])
 def descargar_facturas():
@@ -201,30 +377,101 @@ def descargar_facturas():
         flash("Debe ingresar un CUIL para buscar.")
         return redirect(url_for('index'))
 
+    # La conexión queda tomada mientras se transmite el archivo: la devuelve el generador al terminar
+    # o, si el cliente corta antes de empezar a leer, el cierre de la respuesta
     try:
-        with conectar_sqlserver() as conn:
-            cursor = conn.cursor()
-            facturas = buscar_facturas_por_cuil(cursor, cuil, entidad_id if entidad_id else None)
-            if not facturas:
-                flash(f"No se encontraron facturas para el CUIL: {cuil}")
-                return redirect(url_for('index'))
-            
-            # Se genera el CSV directamente desde los datos obtenidos
-            si = StringIO()
-            writer = csv.DictWriter(si, fieldnames=facturas[0].keys())
-            writer.writeheader()
-            writer.writerows(facturas)
-            output = si.getvalue()
-            
-            # Se devuelve como archivo descargable
-            response = make_response(output)
-            response.headers["Content-Disposition"] = f"attachment; filename=facturas_{cuil}.csv"
-            response.headers["Content-type"] = "text/csv; charset=utf-8"
-            return response
+        conn = pool.obtener()
+    except Exception as e:
+        flash(f"Error al descargar facturas: {e}")
+        return redirect(url_for('index'))
 
+    devuelta = []
+    def devolver_conexion():
+        if not devuelta:
+            devuelta.append(True)
+            pool.devolver(conn)
+
+    response = None
+    try:
+        cursor = conn.cursor()
+        columnas = ejecutar_busqueda_por_cuil(cursor, cuil, entidad_id if entidad_id else None)
+        bloques = iterar_bloques(cursor, TAMANO_BLOQUE_CSV)
+        primer_bloque = next(bloques, None)
+
+        if not primer_bloque:
+            flash(f"No se encontraron facturas para el CUIL: {cuil}")
+            return redirect(url_for('index'))
+
+        # Se genera el CSV de a bloques: la memoria usada no depende de la cantidad de facturas
+        def generar():
+            try:
+                si = StringIO()
+                writer = csv.writer(si)
+                writer.writerow(columnas)
+                writer.writerows(primer_bloque)
+                yield si.getvalue()
+                for filas in bloques:
+                    si.seek(0)
+                    si.truncate(0)
+                    writer.writerows(filas)
+                    yield si.getvalue()
+            finally:
+                devolver_conexion()
+
+        # Se devuelve como archivo descargable
+        response = Response(generar(), mimetype='text/csv')
+        response.headers["Content-Disposition"] = f"attachment; filename=facturas_{cuil}.csv"
+        response.headers["Content-type"] = "text/csv; charset=utf-8"
+        response.call_on_close(devolver_conexion)
+        return response
     except Exception as e:
         flash(f"Error al descargar facturas: {e}")
         return redirect(url_for('index'))
+    finally:
+        # Si no llegó a armarse la respuesta, nadie más va a devolver la conexión
+        if response is None:
+            devolver_conexion()
+
+# Ruta que expone las métricas del pool de conexiones
+@app.route('/pool', methods=['GET'])
+def estado_pool():
+    return jsonify(pool.metricas())
+
+# Métricas del pool para /metrics: clave de pool.metricas() -> (nombre, tipo, descripción).
+# Los valores acumulados desde el arranque son counters (terminan en _total); el resto, gauges
+METRICAS_POOL = {
+    'tamano': ('facturai_pool_tamano', 'gauge', 'Máximo de conexiones abiertas a la vez.'),
+    'en_uso': ('facturai_pool_en_uso', 'gauge', 'Conexiones prestadas en este momento.'),
+    'libres': ('facturai_pool_libres', 'gauge', 'Conexiones abiertas esperando ser usadas.'),
+    'abiertas': ('facturai_pool_abiertas', 'gauge', 'Conexiones abiertas (en uso y libres).'),
+    'esperas': ('facturai_pool_esperas_total', 'counter', 'Pedidos que tuvieron que esperar una conexión.'),
+    'creaciones': ('facturai_pool_creaciones_total', 'counter', 'Conexiones abiertas contra la base.'),
+    'descartes': ('facturai_pool_descartes_total', 'counter', 'Conexiones cerradas por estar cortadas.'),
+    'segundos_esperando': ('facturai_pool_espera_segundos_total', 'counter',
+                           'Tiempo total esperando una conexión libre.'),
+}
+
+# Métricas de la cache de OCR del servidor: clave de estadisticas() -> (nombre, tipo, descripción)
+METRICAS_CACHE = {
+    'aciertos': ('facturai_cache_ocr_aciertos_total', 'counter', 'Lecturas de la cache de OCR con resultado.'),
+    'fallos': ('facturai_cache_ocr_fallos_total', 'counter', 'Lecturas de la cache de OCR sin resultado.'),
+    'desalojos': ('facturai_cache_ocr_desalojos_total', 'counter', 'Entradas borradas por tamaño.'),
+    'tamano': ('facturai_cache_ocr_bytes', 'gauge', 'Tamaño ocupado por la cache de OCR.'),
+}
+
+# Ruta que expone los tiempos por etapa (y el estado del pool y de la cache) en el formato de texto de Prometheus
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    lineas = [REGISTRO.exportar_prometheus()]
+    for clave, valor in pool.metricas().items():
+        nombre, tipo, ayuda = METRICAS_POOL[clave]
+        lineas.append(exportar_valor(nombre, tipo, ayuda, valor))
+    cache = obtener_cache()
+    if cache:
+        for clave, valor in cache.estadisticas().items():
+            nombre, tipo, ayuda = METRICAS_CACHE[clave]
+            lineas.append(exportar_valor(nombre, tipo, ayuda, valor))
+    return Response(''.join(lineas), mimetype='text/plain; version=0.0.4')
 
 # Punto de entrada principal para ejecutar la aplicación Flask
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+# Benchmark de la lectura de códigos de barras: compara zbar sobre la página completa con todas las
+# simbologías (como se leía antes) contra utils.barcode_utils.extraer_codigos_barras (simbologías de
+# pago, franja inferior reducida primero). Informa el tiempo por página, cuántas páginas salieron con
+# el código esperado y cuántos códigos decodificados no son de pago (QR, EAN, etc.).
+#
+# Uso: python -m benchmarks.bench_codigos --cantidad 30 [--carpeta facturas_sinteticas]
+import argparse
+import statistics
+import tempfile
+import time
+
+from pyzbar.pyzbar import decode
+
+from benchmarks.generador import generar_lote
+from utils import barcode_utils
+from utils.ocr import convertir_a_opencv
+from utils.pdf_utils import convertir_pdf_a_imagen
+
+
+def decodificar_todo(gris):
+    """
+    Lectura de referencia: página completa, todas las simbologías.
+    """
+    return [d.data.decode('utf-8') for d in decode(gris)]
+
+
+def medir(funcion, paginas):
+    tiempos, correctas, sobrantes = [], 0, 0
+    for gris, esperado in paginas:
+        inicio = time.perf_counter()
+        codigos = funcion(gris)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        correctas += esperado in codigos
+        sobrantes += sum(1 for codigo in codigos if not barcode_utils.es_codigo_de_pago(codigo))
+    return tiempos, correctas, sobrantes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara la lectura de códigos de barras completa y restringida.")
+    parser.add_argument('--cantidad', type=int, default=30, help="Cantidad de facturas sintéticas.")
+    parser.add_argument('--carpeta', help="Carpeta donde generar las facturas (por defecto, una temporal).")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temporal:
+        facturas = generar_lote(args.carpeta or temporal, args.cantidad, args.semilla)
+        paginas = [(convertir_a_opencv(convertir_pdf_a_imagen(ruta)), esperado['codigo_barra'])
+                   for ruta, esperado in facturas]
+
+    print(f"{'lectura':<14}{'media ms':>10}{'p50 ms':>10}{'máx ms':>10}{'correctas':>12}{'no de pago':>12}")
+    for nombre, funcion in (('completa', decodificar_todo), ('restringida', barcode_utils.extraer_codigos_barras)):
+        tiempos, correctas, sobrantes = medir(funcion, paginas)
+        print(f"{nombre:<14}{statistics.mean(tiempos):>10.1f}{statistics.median(tiempos):>10.1f}"
+              f"{max(tiempos):>10.1f}{correctas:>8}/{len(paginas)}{sobrantes:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# Benchmark de punta a punta: genera facturas sintéticas, las procesa con main.extraer_datos_factura
+# (rasterizado → códigos de barras → clasificación → OCR → parser) y las inserta por lotes en la
+# base SQLite local (utils/almacenamiento_local.py), con el mismo camino que
+# `main.py --almacenamiento sqlite`. Informa percentiles de latencia por etapa, facturas por segundo,
+# pico de memoria y cuántas facturas se extrajeron con todos los campos correctos.
+#
+# Uso: python -m benchmarks.bench_e2e --cantidad 30 [--rapido] [--carpeta facturas_sinteticas]
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import main
+from benchmarks.generador import generar_lote
+from utils.almacenamiento_local import conectar_sqlite
+
+# Funciones de main.py que se cronometran y la etapa a la que corresponden
+ETAPAS = {
+    'extraer_texto_embebido': 'texto_embebido',
+    'convertir_pdf_a_imagen': 'rasterizado',
+    'convertir_a_opencv': 'conversion',
+    'extraer_codigos_barras': 'codigos_barras',
+    'clasificar_factura': 'clasificacion',
+    'preprocesar_para_ocr': 'preprocesado',
+    'aplicar_ocr_por_regiones': 'ocr',
+    'aplicar_ocr': 'ocr',
+    'despachar_parser': 'parser',
+}
+
+# Campos que se comparan contra los datos esperados
+CAMPOS_COMPARADOS = ('entidad_id', 'codigo_barra', 'cliente', 'monto', 'vencimiento', 'periodo', 'condicion_iva')
+
+
+def cronometrar(tiempos):
+    """
+    Reemplaza las funciones de main.py listadas en ETAPAS por versiones que acumulan su duración
+    (en milisegundos) en `tiempos[etapa]`. Devuelve una función que restaura las originales.
+    """
+    originales = {nombre: getattr(main, nombre) for nombre in ETAPAS}
+
+    def envolver(nombre, funcion):
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                tiempos[ETAPAS[nombre]][-1] += (time.perf_counter() - inicio) * 1000
+        return medida
+
+    for nombre, funcion in originales.items():
+        setattr(main, nombre, envolver(nombre, funcion))
+
+    def restaurar():
+        for nombre, funcion in originales.items():
+            setattr(main, nombre, funcion)
+    return restaurar
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+def pico_memoria_mb():
+    """
+    Pico de memoria residente del proceso en MB, o None si no se puede medir en esta plataforma.
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa kilobytes; macOS, bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def coincide(datos, esperado):
+    return all(str(datos.get(campo)) == str(esperado[campo]) for campo in CAMPOS_COMPARADOS)
+
+
+def ejecutar(facturas, rapido=False, tamano_lote=50, base=':memory:'):
+    """
+    Procesa e inserta las facturas midiendo cada etapa.
+
+    Returns:
+        dict: Tiempos por etapa (ms por factura), total del proceso, correctas y resultado de la carga.
+    """
+    tiempos = defaultdict(list)
+    restaurar = cronometrar(tiempos)
+    conn = conectar_sqlite(base)
+    correctas, errores, lote = 0, [], []
+    insertadas = duplicadas = 0
+
+    def cargar(lote):
+        inicio = time.perf_counter()
+        ins, dup, err = main.insertar_facturas_lote_sqlite(conn, lote)
+        # El costo del lote se reparte entre sus facturas
+        tiempos['insercion'].extend([(time.perf_counter() - inicio) * 1000 / len(lote)] * len(lote))
+        errores.extend(mensaje for _, mensaje in err)
+        return len(ins), len(dup)
+
+    inicio_total = time.perf_counter()
+    try:
+        for ruta, esperado in facturas:
+            for etapa in set(ETAPAS.values()):
+                tiempos[etapa].append(0.0)
+            inicio = time.perf_counter()
+            try:
+                datos, _ = main.extraer_datos_factura(ruta, rapido=rapido, usar_texto_embebido=True)
+            except Exception as e:
+                errores.append(f"{os.path.basename(ruta)}: {e}")
+                continue
+            finally:
+                tiempos['total_extraccion'].append((time.perf_counter() - inicio) * 1000)
+            correctas += coincide(datos, esperado)
+            lote.append(datos)
+            if len(lote) >= tamano_lote:
+                ins, dup = cargar(lote)
+                insertadas, duplicadas, lote = insertadas + ins, duplicadas + dup, []
+        if lote:
+            ins, dup = cargar(lote)
+            insertadas, duplicadas = insertadas + ins, duplicadas + dup
+    finally:
+        restaurar()
+        conn.close()
+
+    return {
+        'tiempos': tiempos,
+        'segundos': time.perf_counter() - inicio_total,
+        'correctas': correctas,
+        'insertadas': insertadas,
+        'duplicadas': duplicadas,
+        'errores': errores,
+    }
+
+
+def informar(resultado, cantidad):
+    print(f"{'etapa':<18}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for etapa, valores in sorted(resultado['tiempos'].items()):
+        if not valores or not any(valores):
+            continue
+        print(f"{etapa:<18}{percentil(valores, 50):>10.1f}{percentil(valores, 90):>10.1f}"
+              f"{percentil(valores, 99):>10.1f}{max(valores):>10.1f}")
+
+    segundos = resultado['segundos']
+    print(f"\nFacturas: {cantidad} en {segundos:.1f} s ({cantidad / segundos:.2f} facturas/s)")
+    print(f"Extracción correcta: {resultado['correctas']}/{cantidad}")
+    print(f"Insertadas: {resultado['insertadas']}, duplicadas: {resultado['duplicadas']}, "
+          f"errores: {len(resultado['errores'])}")
+    for error in resultado['errores'][:5]:
+        print(f"  {error}")
+    pico = pico_memoria_mb()
+    print(f"Pico de memoria (RSS): {pico:.0f} MB" if pico is not None else "Pico de memoria: no disponible")
+    if resultado['tiempos']['total_extraccion']:
+        print(f"Latencia media por factura: {statistics.mean(resultado['tiempos']['total_extraccion']):.1f} ms")
+
+
+def main_benchmark(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta con facturas sintéticas.")
+    parser.add_argument('--cantidad', type=int, default=30, help="Cantidad de facturas sintéticas.")
+    parser.add_argument('--carpeta', help="Carpeta donde generar las facturas (por defecto, una temporal).")
+    parser.add_argument('--rapido', action='store_true', help="Usa el camino rápido (códigos de barras primero).")
+    parser.add_argument('--lote', type=int, default=50, help="Facturas por lote de inserción.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador.")
+    parser.add_argument('--base', default=':memory:',
+                        help="Base SQLite donde se insertan las facturas (por defecto, en memoria; "
+                             "un archivo mide también la escritura a disco).")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temporal:
+        carpeta = args.carpeta or temporal
+        facturas = generar_lote(carpeta, args.cantidad, args.semilla)
+        resultado = ejecutar(facturas, rapido=args.rapido, tamano_lote=args.lote, base=args.base)
+    informar(resultado, len(facturas))
+
+
+if __name__ == "__main__":
+    main_benchmark()
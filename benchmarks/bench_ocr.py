@@ -0,0 +1,82 @@
+# Benchmark del OCR: compara pytesseract (un proceso de tesseract por llamada, con la carga del
+# modelo de idioma cada vez) contra el motor persistente de tesserocr sobre la misma imagen.
+#
+# Uso: python -m benchmarks.bench_ocr [--repeticiones 20] [--config "--psm 6"]
+import argparse
+import statistics
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from utils import ocr
+
+# Texto con la forma de un recuadro de totales de factura
+TEXTO_MUESTRA = (
+    "Cliente: 00123456\n"
+    "1º Vencimiento 15/03/2025\n"
+    "Periodo 02/2025\n"
+    "Total $ 12.345,67\n"
+    "Condición IVA: Consumidor Final"
+)
+
+
+def generar_imagen(ancho=1600, alto=500):
+    """
+    Genera una imagen en formato OpenCV (BGR) con texto de factura.
+    """
+    imagen = Image.new('RGB', (ancho, alto), 'white')
+    dibujo = ImageDraw.Draw(imagen)
+    try:
+        fuente = ImageFont.truetype('DejaVuSans.ttf', 36)
+    except OSError:
+        fuente = ImageFont.load_default()
+    dibujo.multiline_text((40, 40), TEXTO_MUESTRA, fill='black', font=fuente, spacing=20)
+    return np.array(imagen)[:, :, ::-1].copy()
+
+
+def medir(funcion, repeticiones):
+    """
+    Ejecuta la función varias veces y devuelve los tiempos en milisegundos.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def informar(nombre, tiempos):
+    print(f"{nombre:<12} media {statistics.mean(tiempos):8.1f} ms   "
+          f"mediana {statistics.median(tiempos):8.1f} ms   mín {min(tiempos):8.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara el costo por llamada de los backends de OCR.")
+    parser.add_argument('--repeticiones', type=int, default=20, help="Llamadas por backend.")
+    parser.add_argument('--config', default='--psm 6', help="Parámetros de Tesseract.")
+    args = parser.parse_args(argv)
+
+    imagen_cv = generar_imagen()
+    resultados = {}
+
+    ocr.BACKEND_OCR = 'pytesseract'
+    resultados['pytesseract'] = medir(lambda: ocr.aplicar_ocr(imagen_cv, args.config), args.repeticiones)
+
+    if ocr.tesserocr is None:
+        print("tesserocr no está instalado: solo se mide pytesseract.")
+    else:
+        ocr.BACKEND_OCR = 'tesserocr'
+        ocr.aplicar_ocr(imagen_cv, args.config)  # la primera llamada inicializa el motor del hilo
+        resultados['tesserocr'] = medir(lambda: ocr.aplicar_ocr(imagen_cv, args.config), args.repeticiones)
+
+    for nombre, tiempos in resultados.items():
+        informar(nombre, tiempos)
+    if len(resultados) == 2:
+        ahorro = statistics.mean(resultados['pytesseract']) - statistics.mean(resultados['tesserocr'])
+        print(f"Costo fijo evitado por llamada: {ahorro:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Calibración del preprocesado de OCR por proveedor: para cada combinación de resolución, enderezado
+# y binarización, lee las facturas de una muestra con el mismo camino que main.leer_texto (regiones de
+# la plantilla y, si falta algún campo, página completa), las parsea y compara contra los datos
+# esperados. Informa el tiempo medio de preprocesado + OCR y cuántas facturas salieron correctas, y
+# sugiere por proveedor la combinación más rápida que no pierde precisión respecto de la mejor.
+#
+# Uso: python -m benchmarks.calibrar_preprocesado --cantidad 30 [--inclinacion 2] [--carpeta muestra]
+# Con --carpeta sobre una muestra real, la carpeta tiene que tener un esperados.json como el que
+# escribe benchmarks/generador.py.
+import argparse
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+import main
+from benchmarks.bench_e2e import coincide
+from benchmarks.generador import ENTIDAD_ID, generar_lote
+from utils import plantillas
+
+# Proveedor de cada entidad_id de los datos esperados
+ENTIDAD_POR_ID = {id_entidad: entidad for entidad, id_entidad in ENTIDAD_ID.items()}
+
+# Resoluciones que se prueban, de mayor a menor
+DPIS = (300, 250, 200, 150)
+
+
+def candidatos(dpis=DPIS):
+    """
+    Combinaciones de preprocesado a probar. None es la página sin preprocesar (la referencia).
+    """
+    yield None
+    for dpi, enderezar, binarizar in itertools.product(dpis, (False, True), (False, True)):
+        yield {'dpi': dpi, 'enderezar': enderezar, 'binarizar': binarizar}
+
+
+def describir(opciones):
+    if opciones is None:
+        return 'sin preprocesar'
+    pasos = [f"{opciones['dpi']} dpi"]
+    pasos += [paso for paso in ('enderezar', 'binarizar') if opciones[paso]]
+    return ' + '.join(pasos)
+
+
+def cargar_muestra(carpeta):
+    """
+    Rasteriza cada factura de la muestra una sola vez y lee sus códigos de barras.
+
+    Returns:
+        list: Tuplas (proveedor, imagen en formato OpenCV, códigos, datos esperados).
+    """
+    with open(os.path.join(carpeta, 'esperados.json'), encoding='utf-8') as f:
+        esperados = json.load(f)
+    muestra = []
+    for nombre, esperado in sorted(esperados.items()):
+        imagen_cv = main.convertir_a_opencv(main.convertir_pdf_a_imagen(os.path.join(carpeta, nombre)))
+        codigos = main.extraer_codigos_barras(imagen_cv)
+        muestra.append((ENTIDAD_POR_ID[esperado['entidad_id']], imagen_cv, codigos, esperado))
+    return muestra
+
+
+def evaluar(muestra, opciones_por_probar):
+    """
+    Lee y parsea la muestra con cada combinación de preprocesado.
+
+    Returns:
+        dict: {(proveedor, índice de la combinación): {'ms': [..], 'correctas': int, 'total': int}}
+    """
+    resultados = defaultdict(lambda: {'ms': [], 'correctas': 0, 'total': 0})
+    originales = dict(plantillas.CONFIG_OCR)
+    try:
+        for indice, opciones in enumerate(opciones_por_probar):
+            for entidad, imagen_cv, codigos, esperado in muestra:
+                base = originales.get(entidad, plantillas.CONFIG_OCR_POR_DEFECTO)
+                plantillas.CONFIG_OCR[entidad] = dict(base, preprocesado=opciones)
+                inicio = time.perf_counter()
+                texto = main.leer_texto(imagen_cv, entidad, codigos)
+                resultado = resultados[(entidad, indice)]
+                resultado['ms'].append((time.perf_counter() - inicio) * 1000)
+                datos = main.despachar_parser(entidad, texto, codigos)
+                datos['entidad_id'] = ENTIDAD_ID[entidad]
+                resultado['correctas'] += coincide(datos, esperado)
+                resultado['total'] += 1
+    finally:
+        plantillas.CONFIG_OCR.clear()
+        plantillas.CONFIG_OCR.update(originales)
+    return resultados
+
+
+def informar(resultados, opciones_por_probar):
+    """
+    Imprime la tabla por proveedor y devuelve la combinación sugerida para cada uno.
+    """
+    sugeridas = {}
+    for entidad in sorted({e for e, _ in resultados}):
+        print(f"\n{entidad}")
+        print(f"  {'preprocesado':<32}{'ms medio':>10}{'correctas':>12}")
+        filas = [(indice, statistics.mean(r['ms']), r['correctas'], r['total'])
+                 for (e, indice), r in sorted(resultados.items()) if e == entidad]
+        for indice, ms, correctas, total in filas:
+            print(f"  {describir(opciones_por_probar[indice]):<32}{ms:>10.1f}{correctas:>8}/{total}")
+        # La más rápida entre las que logran la mejor precisión
+        mejor = max(correctas for _, _, correctas, _ in filas)
+        indice, ms, correctas, total = min((f for f in filas if f[2] == mejor), key=lambda f: f[1])
+        sugeridas[entidad] = opciones_por_probar[indice]
+        print(f"  sugerido: {describir(sugeridas[entidad])} ({ms:.1f} ms, {correctas}/{total})")
+    return sugeridas
+
+
+def main_calibracion(argv=None):
+    parser = argparse.ArgumentParser(description="Calibra el preprocesado de OCR de cada proveedor.")
+    parser.add_argument('--carpeta', help="Muestra con esperados.json (por defecto, se generan facturas sintéticas).")
+    parser.add_argument('--cantidad', type=int, default=30, help="Cantidad de facturas sintéticas.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla del generador.")
+    parser.add_argument('--inclinacion', type=float, default=2.0,
+                        help="Inclinación máxima de las facturas sintéticas, en grados.")
+    parser.add_argument('--dpi', type=int, nargs='+', default=list(DPIS), help="Resoluciones a probar.")
+    args = parser.parse_args(argv)
+
+    opciones_por_probar = list(candidatos(sorted(args.dpi, reverse=True)))
+    with tempfile.TemporaryDirectory() as temporal:
+        if args.carpeta:
+            carpeta = args.carpeta
+        else:
+            carpeta = temporal
+            generar_lote(carpeta, args.cantidad, args.semilla, args.inclinacion)
+        muestra = cargar_muestra(carpeta)
+    resultados = evaluar(muestra, opciones_por_probar)
+    sugeridas = informar(resultados, opciones_por_probar)
+
+    print("\nValores para CONFIG_OCR en utils/plantillas.py:")
+    for entidad, opciones in sugeridas.items():
+        print(f"  '{entidad}': 'preprocesado': {opciones}")
+
+
+if __name__ == "__main__":
+    main_calibracion()
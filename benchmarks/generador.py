@@ -0,0 +1,204 @@
+# Generador de facturas sintéticas de Edesur, Metrogas y Movistar para los benchmarks.
+#
+# Cada factura es un PDF de una página (imagen A4, sin capa de texto) con los bloques de texto
+# ubicados dentro de las regiones de utils/plantillas.py y un código de barras Code128 con el
+# formato que esperan los extraer_datos_codigo_* de cada parser. Junto con cada PDF se devuelven
+# los datos esperados, para poder medir también la precisión de la extracción.
+#
+# Uso: python -m benchmarks.generador --carpeta facturas_sinteticas --cantidad 30
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+
+import barcode
+from barcode.writer import ImageWriter
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.clasificador import clasificar_por_codigo
+
+# Resolución de las páginas generadas (la misma con la que se rasterizan las facturas)
+DPI = 300
+ANCHO_PAGINA, ALTO_PAGINA = 2480, 3508  # A4 a 300 DPI
+
+ENTIDADES = ('edesur', 'metrogas', 'movistar')
+
+# Condiciones frente al IVA impresas y el valor que devuelve el parser de cada proveedor
+CONDICIONES_IVA = {
+    'edesur': {'Consumidor Final': 'Consumidor Final', 'Responsable Inscripto': 'Responsable Inscripto',
+               'Exento': 'Exento'},
+    'metrogas': {'Consumidor Final': 'Consumidor Final', 'Responsable Inscripto': 'Responsable Inscripto',
+                 'Exento': 'Exento'},
+    'movistar': {'Consumidor Final': 'Consumidor Final', 'Responsable Inscripto': 'Resp Inscripto',
+                 'Exento': 'Exento'},
+}
+
+ENTIDAD_ID = {'edesur': 1, 'metrogas': 2, 'movistar': 3}
+
+
+def _digitos(azar, cantidad):
+    return ''.join(azar.choice('0123456789') for _ in range(cantidad))
+
+
+def _fuente(tamano):
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', tamano)
+    except OSError:
+        return ImageFont.load_default(size=tamano)
+
+
+def _monto_impreso(monto):
+    """
+    Formatea un importe como se imprime en las facturas: 12.345,67
+    """
+    return f"{monto:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def _periodo(vencimiento):
+    anterior = vencimiento.replace(day=1) - timedelta(days=1)
+    return anterior.strftime('%m/%Y')
+
+
+def _codigo_edesur(azar, cliente, centavos, vencimiento):
+    # [5:13] cliente, [13:24] monto en centavos, [24:30] vencimiento AAMMDD
+    return _digitos(azar, 5) + cliente + f"{centavos:011d}" + vencimiento.strftime('%y%m%d') + _digitos(azar, 14)
+
+
+def _codigo_metrogas(azar, cliente, centavos):
+    # [20:28] monto en centavos, [33:44] cliente
+    return _digitos(azar, 20) + f"{centavos:08d}" + _digitos(azar, 5) + cliente + _digitos(azar, 4)
+
+
+def _codigo_movistar(azar, pesos, vencimiento):
+    # [14:20] monto en pesos, [20:28] vencimiento DDMMAAAA
+    return _digitos(azar, 14) + f"{pesos:06d}" + vencimiento.strftime('%d%m%Y') + _digitos(azar, 8)
+
+
+def generar_datos(entidad, azar):
+    """
+    Genera los datos de una factura y su código de barras.
+
+    Returns:
+        tuple: (datos esperados, texto del encabezado, texto de totales)
+    """
+    while True:
+        vencimiento = date(2025, 1, 1) + timedelta(days=azar.randrange(365))
+        condicion = azar.choice(list(CONDICIONES_IVA[entidad]))
+        if entidad == 'edesur':
+            cliente = _digitos(azar, 8)
+            centavos = azar.randrange(1000, 5000000)
+            codigo = _codigo_edesur(azar, cliente, centavos, vencimiento)
+            encabezado = [("EDESUR S.A.", 90), (f"Cliente: {cliente}", 48),
+                          (f"Periodo {_periodo(vencimiento)}", 48), (f"Condición IVA: {condicion}", 48)]
+            totales = [(f"1º Vencimiento ({vencimiento:%d/%m/%Y})", 48),
+                       (f"Total $ {_monto_impreso(centavos / 100)}", 56)]
+        elif entidad == 'metrogas':
+            cliente = _digitos(azar, 11)
+            centavos = azar.randrange(1000, 5000000)
+            codigo = _codigo_metrogas(azar, cliente, centavos)
+            encabezado = [("METROGAS S.A.", 90), (f"Cliente: {cliente}", 48),
+                          (f"Condición frente al IVA: {condicion}", 48), (f"Periodo: {_periodo(vencimiento)}", 48)]
+            totales = [(f"Vencimiento: {vencimiento:%d/%m/%Y}", 48),
+                       (f"Total $ {_monto_impreso(centavos / 100)}", 56)]
+        else:
+            cliente = _digitos(azar, 10)
+            centavos = azar.randrange(10, 50000) * 100  # Movistar codifica pesos enteros
+            codigo = _codigo_movistar(azar, centavos // 100, vencimiento)
+            encabezado = [("movistar", 90), (f"Cliente N° {cliente}", 48),
+                          (f"Condición frente al IVA: {condicion}", 48)]
+            totales = [(f"Vencimiento: {vencimiento:%d/%m/%Y}", 48),
+                       (f"Monto Total: $ {_monto_impreso(centavos / 100)}", 56)]
+        # Se descartan los códigos que por azar también tienen la estructura de otro proveedor
+        if clasificar_por_codigo([codigo]) == entidad:
+            break
+
+    datos = {
+        'entidad_id': ENTIDAD_ID[entidad],
+        'codigo_barra': codigo,
+        'cliente': cliente,
+        'monto': f"{centavos / 100:.2f}",
+        'vencimiento': vencimiento.strftime('%d/%m/%Y'),
+        'periodo': _periodo(vencimiento),
+        'condicion_iva': CONDICIONES_IVA[entidad][condicion],
+    }
+    return datos, encabezado, totales
+
+
+def dibujar_factura(entidad, encabezado, totales, codigo):
+    """
+    Dibuja la página de la factura.
+
+    Returns:
+        PIL.Image: Página en escala de grises.
+    """
+    pagina = Image.new('L', (ANCHO_PAGINA, ALTO_PAGINA), 255)
+    dibujo = ImageDraw.Draw(pagina)
+
+    # Encabezado dentro del 25% superior, totales entre el 30% y el 55% (ver utils/plantillas.py)
+    x_totales = int(ANCHO_PAGINA * (0.45 if entidad == 'metrogas' else 0.05))
+    for bloque, x, y in ((encabezado, int(ANCHO_PAGINA * 0.05), int(ALTO_PAGINA * 0.03)),
+                         (totales, x_totales, int(ALTO_PAGINA * 0.33))):
+        for linea, tamano in bloque:
+            dibujo.text((x, y), linea, fill=0, font=_fuente(tamano))
+            y += int(tamano * 1.6)
+
+    # Texto de relleno para que la página tenga el volumen de una factura real
+    fuente = _fuente(30)
+    for i in range(12):
+        y = int(ALTO_PAGINA * 0.62) + i * 55
+        dibujo.text((int(ANCHO_PAGINA * 0.05), y), f"Detalle de consumo {i + 1:02d} ........ {i * 137 % 1000},00",
+                    fill=0, font=fuente)
+
+    # Código de barras al pie de la página
+    imagen_codigo = barcode.get('code128', codigo, writer=ImageWriter()).render(
+        {'module_width': 0.25, 'module_height': 15.0, 'dpi': DPI, 'write_text': False, 'quiet_zone': 6.5}
+    ).convert('L')
+    x = (ANCHO_PAGINA - imagen_codigo.width) // 2
+    pagina.paste(imagen_codigo, (max(0, x), int(ALTO_PAGINA * 0.86)))
+    return pagina
+
+
+def generar_lote(carpeta, cantidad, semilla=0, inclinacion=0.0):
+    """
+    Genera `cantidad` facturas alternando proveedores y las guarda en la carpeta.
+
+    Los nombres de archivo no mencionan al proveedor, así que también se ejercita el clasificador.
+    Con `inclinacion` cada página se rota un ángulo al azar entre -inclinacion y +inclinacion grados,
+    como un escaneo torcido.
+
+    Returns:
+        list: Pares (ruta del PDF, datos esperados).
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    azar = random.Random(semilla)
+    facturas = []
+    for i in range(cantidad):
+        entidad = ENTIDADES[i % len(ENTIDADES)]
+        datos, encabezado, totales = generar_datos(entidad, azar)
+        ruta = os.path.join(carpeta, f"factura_{i + 1:05d}.pdf")
+        pagina = dibujar_factura(entidad, encabezado, totales, datos['codigo_barra'])
+        if inclinacion:
+            pagina = pagina.rotate(azar.uniform(-inclinacion, inclinacion), resample=Image.BICUBIC, fillcolor=255)
+        pagina.save(ruta, resolution=DPI)
+        facturas.append((ruta, datos))
+
+    with open(os.path.join(carpeta, 'esperados.json'), 'w', encoding='utf-8') as f:
+        json.dump({os.path.basename(ruta): datos for ruta, datos in facturas}, f, ensure_ascii=False, indent=2)
+    return facturas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera facturas sintéticas para los benchmarks.")
+    parser.add_argument('--carpeta', default='facturas_sinteticas', help="Carpeta de salida.")
+    parser.add_argument('--cantidad', type=int, default=30, help="Cantidad de facturas a generar.")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla para obtener siempre las mismas facturas.")
+    parser.add_argument('--inclinacion', type=float, default=0.0, help="Inclinación máxima de las páginas, en grados.")
+    args = parser.parse_args(argv)
+
+    facturas = generar_lote(args.carpeta, args.cantidad, args.semilla, args.inclinacion)
+    print(f"{len(facturas)} facturas generadas en {args.carpeta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,34 @@
 import sys
 import os
-from datetime import datetime
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from datetime import datetime, date
 import re
 
 # Librerías propias del proyecto
 import pyodbc
-from utils.pdf_utils import convertir_pdf_a_imagen
-from utils.ocr import extraer_texto_de_imagen
+from utils.pdf_utils import (
+    convertir_pdf_a_imagen, contar_paginas, DPI_POR_DEFECTO, ESCALA_DE_GRISES,
+    extraer_texto_embebido, tiene_capa_de_texto, buscar_codigos_en_texto, nombre_pdf, leer_pdf
+)
+from utils.ocr import (
+    convertir_a_opencv, aplicar_ocr, aplicar_ocr_por_regiones, IDIOMA_OCR
+)
+from utils.preprocesado import preprocesar_para_ocr
 from utils.barcode_utils import extraer_codigos_barras
+from utils.cache_ocr import obtener_cache
+from utils.plantillas import obtener_plantilla, obtener_config_ocr, VERSION_PLANTILLAS
+from utils.clasificador import clasificar_factura, clasificar_por_texto, clasificar_por_codigo
+from utils.metricas import REGISTRO, cronometrado, medir, recolectar
+from utils.manifiesto import Manifiesto
+from utils.referencias import REFERENCIAS, FacturaDuplicada, inicializar_referencias
+from utils.almacenamiento_local import (
+    conectar_sqlite, insertar_filas_sqlite, hay_pendientes, facturas_pendientes, marcar_sincronizadas,
+    guardar_entidades
+)
 from parsers.parser_metrogas import parsear_factura_metrogas
 from parsers.parser_edesur import parsear_factura_edesur
 from parsers.parser_movistar import parsear_factura_movistar
@@ -26,31 +47,21 @@ def conectar_sqlserver():
     )
     return conn
 
-# Esta función inserta una factura en la base de datos
-def insertar_factura(cursor, datos):
-    # Primero revisamos si la factura ya fue cargada, basándonos en el código de barras
-    cursor.execute("SELECT COUNT(1) FROM Facturas WHERE codigo_barra = ?", datos['codigo_barra'])
-    if cursor.fetchone()[0] > 0:
-        return False  # Si ya existe, no la insertamos de nuevo
-
+# Esta función arma los parámetros de inserción de una factura, validando las fechas
+def preparar_parametros(datos):
     # Convertimos el vencimiento de texto a objeto datetime
     try:
         fecha_vencimiento = datetime.strptime(datos['vencimiento'], '%d/%m/%Y')
-    except ValueError:
-        raise ValueError(f"Formato de vencimiento inválido: {datos['vencimiento']}")
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Formato de vencimiento inválido: {datos.get('vencimiento')}")
 
     # Convertimos el periodo también a datetime, usando el día 1 por convención
     try:
         periodo_dt = datetime.strptime(datos['periodo'], '%m/%Y')
-    except ValueError:
-        raise ValueError(f"Formato de periodo inválido: {datos['periodo']}")
+    except (ValueError, TypeError, KeyError):
+        raise ValueError(f"Formato de periodo inválido: {datos.get('periodo')}")
 
-    # Sentencia SQL para insertar los datos en la tabla Facturas
-    sql = """
-    INSERT INTO Facturas (archivo, entidad_id, cliente, monto, vencimiento, periodo, condicion_iva, codigo_barra, cuil)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
-    params = (
+    return (
         datos.get('archivo'),
         datos.get('entidad_id'),
         datos.get('cliente'),
@@ -61,39 +72,467 @@ def insertar_factura(cursor, datos):
         datos.get('codigo_barra'),
         datos.get('cuil'),  # Campo nuevo: CUIL del cliente
     )
-    cursor.execute(sql, params)
-    return True
+
+# Tabla temporal donde se carga cada lote antes de pasarlo a Facturas
+SQL_CREAR_LOTE = """
+IF OBJECT_ID('tempdb..#FacturasLote') IS NOT NULL DROP TABLE #FacturasLote;
+CREATE TABLE #FacturasLote (
+    orden INT NOT NULL,
+    archivo NVARCHAR(255) NOT NULL,
+    entidad_id INT NOT NULL,
+    cliente NVARCHAR(50),
+    monto DECIMAL(18,2),
+    vencimiento DATE,
+    periodo DATE,
+    condicion_iva NVARCHAR(50),
+    codigo_barra NVARCHAR(100) NOT NULL,
+    cuil CHAR(11)
+);
+IF OBJECT_ID('tempdb..#FacturasInsertadas') IS NOT NULL DROP TABLE #FacturasInsertadas;
+CREATE TABLE #FacturasInsertadas (
+    codigo_barra NVARCHAR(100) NOT NULL,
+    cuil CHAR(11),
+    entidad_id INT NOT NULL,
+    periodo DATE,
+    monto DECIMAL(18,2),
+    vencimiento DATE
+);
+"""
+
+# Inserta de una sola vez las filas del lote cuyo código de barras todavía no existe (anti-join contra
+# la columna UNIQUE). Si el mismo código aparece dos veces en el lote, se queda con la primera aparición.
+# Las filas insertadas quedan en #FacturasInsertadas para sumarlas al resumen y devolver sus códigos.
+SQL_PASAR_LOTE = """
+INSERT INTO Facturas (archivo, entidad_id, cliente, monto, vencimiento, periodo, condicion_iva, codigo_barra, cuil)
+OUTPUT inserted.codigo_barra, inserted.cuil, inserted.entidad_id, TRY_CONVERT(DATE, inserted.periodo),
+       inserted.monto, inserted.vencimiento
+INTO #FacturasInsertadas (codigo_barra, cuil, entidad_id, periodo, monto, vencimiento)
+SELECT l.archivo, l.entidad_id, l.cliente, l.monto, l.vencimiento, l.periodo, l.condicion_iva, l.codigo_barra, l.cuil
+FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY codigo_barra ORDER BY orden) AS aparicion
+    FROM #FacturasLote
+) AS l
+WHERE l.aparicion = 1
+  AND NOT EXISTS (
+      SELECT 1 FROM Facturas f WITH (UPDLOCK, HOLDLOCK)
+      WHERE f.codigo_barra = l.codigo_barra
+  );
+"""
+
+# Suma al resumen de gastos las facturas insertadas por el lote, agrupadas por (cuil, entidad, período)
+SQL_RESUMIR_LOTE = """
+MERGE ResumenGastos WITH (HOLDLOCK) AS r
+USING (
+    SELECT cuil, entidad_id, periodo, COUNT(*) AS cantidad, SUM(ISNULL(monto, 0)) AS total,
+           MAX(vencimiento) AS vencimiento
+    FROM #FacturasInsertadas
+    WHERE cuil IS NOT NULL AND periodo IS NOT NULL
+    GROUP BY cuil, entidad_id, periodo
+) AS f
+ON r.cuil = f.cuil AND r.entidad_id = f.entidad_id AND r.periodo = f.periodo
+WHEN MATCHED THEN UPDATE SET
+    cantidad = r.cantidad + f.cantidad,
+    total = r.total + f.total,
+    ultimo_vencimiento = CASE WHEN r.ultimo_vencimiento IS NULL OR f.vencimiento > r.ultimo_vencimiento
+                              THEN f.vencimiento ELSE r.ultimo_vencimiento END
+WHEN NOT MATCHED THEN
+    INSERT (cuil, entidad_id, periodo, cantidad, total, ultimo_vencimiento)
+    VALUES (f.cuil, f.entidad_id, f.periodo, f.cantidad, f.total, f.vencimiento);
+"""
+
+# Esta función valida un lote de facturas y arma las filas a insertar: (orden, parámetros de preparar_parametros).
+# Devuelve las filas y los errores (orden, mensaje) de las facturas que no se pueden insertar
+def preparar_filas(lista_datos):
+    filas, errores = [], []
+    for orden, datos in enumerate(lista_datos):
+        if not datos.get('codigo_barra'):
+            errores.append((orden, 'La factura no tiene código de barras.'))
+            continue
+        try:
+            filas.append((orden,) + preparar_parametros(datos))
+        except ValueError as e:
+            errores.append((orden, str(e)))
+    return filas, errores
+
+# Esta función pasa a Facturas (y al resumen de gastos) filas ya preparadas, con un solo viaje a SQL Server
+# y un único commit. Devuelve los códigos de barras insertados
+def insertar_filas_lote(conn, filas):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SQL_CREAR_LOTE)
+        # fast_executemany manda todas las filas en un único arreglo de parámetros
+        cursor.fast_executemany = True
+        cursor.executemany(
+            "INSERT INTO #FacturasLote (orden, archivo, entidad_id, cliente, monto, vencimiento, periodo, "
+            "condicion_iva, codigo_barra, cuil) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            filas
+        )
+        cursor.execute(SQL_PASAR_LOTE)
+        cursor.execute(SQL_RESUMIR_LOTE)
+        cursor.execute("SELECT codigo_barra FROM #FacturasInsertadas;")
+        codigos_insertados = {fila[0] for fila in cursor.fetchall()}
+        cursor.execute("DROP TABLE #FacturasLote; DROP TABLE #FacturasInsertadas;")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return codigos_insertados
+
+# Esta función inserta un lote con la función `insertar_filas` del almacenamiento y devuelve las posiciones
+# (dentro de la lista recibida) insertadas, las duplicadas y las que tuvieron error
+def _insertar_lote(conn, lista_datos, insertar_filas):
+    insertadas, duplicadas = [], []
+    filas, errores = preparar_filas(lista_datos)
+    if not filas:
+        return insertadas, duplicadas, errores
+
+    codigos_insertados = insertar_filas(conn, filas)
+
+    # Tanto las insertadas como las duplicadas existen ahora en la base
+    REFERENCIAS.agregar_codigos(fila[8] for fila in filas)
+
+    for fila in filas:
+        orden, codigo = fila[0], fila[8]
+        if codigo in codigos_insertados:
+            insertadas.append(orden)
+            # Solo la primera aparición de un código repetido en el lote cuenta como insertada
+            codigos_insertados.discard(codigo)
+        else:
+            duplicadas.append(orden)
+    return insertadas, duplicadas, errores
+
+# Esta función inserta una lista de facturas en SQL Server con un solo viaje a la base por lote y un único commit.
+# Devuelve las posiciones (dentro de la lista recibida) insertadas, las duplicadas y las que tuvieron error.
+@cronometrado('insercion', entidad='todas')
+def insertar_facturas_lote(conn, lista_datos):
+    return _insertar_lote(conn, lista_datos, insertar_filas_lote)
+
+# Esta función inserta una lista de facturas en la base SQLite local, con el mismo contrato que insertar_facturas_lote
+@cronometrado('insercion', entidad='todas')
+def insertar_facturas_lote_sqlite(conn, lista_datos):
+    return _insertar_lote(conn, lista_datos, insertar_filas_sqlite)
+
+# Esta función abre la base donde se cargan las facturas según --almacenamiento y devuelve la conexión
+# y la función que inserta cada lote
+def abrir_almacenamiento(args):
+    if args.almacenamiento == 'sqlite':
+        return conectar_sqlite(args.base_local), insertar_facturas_lote_sqlite
+    return conectar_sqlserver(), insertar_facturas_lote
+
+# Esta función sube a SQL Server, por lotes, las facturas de la base local que todavía no se sincronizaron.
+# Antes baja la tabla Entidades. Las que ya existían en el servidor también quedan marcadas (decide el UNIQUE
+# del servidor), así que si la sincronización se corta a la mitad se puede repetir sin duplicar nada.
+# Devuelve la cantidad de facturas nuevas en el servidor
+def sincronizar(conn_local, conn_servidor, tamano_lote=500):
+    cursor = conn_servidor.cursor()
+    try:
+        cursor.execute("SELECT ID, nombre, cuit, condicion_iva FROM Entidades")
+        guardar_entidades(conn_local, cursor.fetchall())
+    finally:
+        cursor.close()
+
+    subidas = 0
+    while True:
+        pendientes = facturas_pendientes(conn_local, tamano_lote)
+        if not pendientes:
+            return subidas
+        # El id local ocupa el lugar del orden dentro del lote
+        subidas += len(insertar_filas_lote(conn_servidor, pendientes))
+        # Se marcan recién después del commit en el servidor
+        marcar_sincronizadas(conn_local, [fila[0] for fila in pendientes])
+
+# Esta función sincroniza la base local con SQL Server si hay facturas pendientes. Si el servidor no está
+# disponible las facturas quedan pendientes para la próxima vez
+def subir_pendientes(args):
+    conn_local = conectar_sqlite(args.base_local)
+    try:
+        if not hay_pendientes(conn_local):
+            return
+        conn_servidor = conectar_sqlserver()
+        try:
+            subidas = sincronizar(conn_local, conn_servidor, args.lote)
+        finally:
+            conn_servidor.close()
+        print(f'Sincronización con SQL Server: {subidas} facturas nuevas')
+    except Exception as e:
+        print(f'No se pudo sincronizar con SQL Server (se reintenta en la próxima carga): {e}')
+    finally:
+        conn_local.close()
 
 # Esta función recorre una carpeta y devuelve todos los archivos PDF que encuentre
 def cargar_facturas(carpeta):
     facturas = []
-    for archivo in os.listdir(carpeta):
-        if archivo.endswith('.pdf'):
-            facturas.append(os.path.join(carpeta, archivo))
+    with os.scandir(carpeta) as entradas:
+        for entrada in entradas:
+            if entrada.name.endswith('.pdf') and entrada.is_file():
+                facturas.append(entrada.path)
     return facturas
 
-# Esta función convierte el PDF en imagen, le aplica OCR y lee los códigos de barras
-def procesar_factura(pdf_path):
-    imagen = convertir_pdf_a_imagen(pdf_path)
-    texto, imagen_cv = extraer_texto_de_imagen(imagen)
+# Esta función deja solo los archivos que el manifiesto marca como nuevos o modificados
+def filtrar_pendientes(facturas, manifiesto, reintentar_errores=False):
+    pendientes = []
+    for factura in facturas:
+        try:
+            if manifiesto.pendiente(factura, reintentar_errores):
+                pendientes.append(factura)
+        except OSError as e:
+            # El archivo se borró o movió entre el listado y la revisión
+            print(f'No se pudo revisar {factura}: {e}')
+    return pendientes
+
+# Esta función aplica OCR usando la plantilla y los parámetros del proveedor (solo las regiones con datos)
+# y, si algún campo queda vacío, vuelve a leer la página completa
+# La página se preprocesa una sola vez (reducción, enderezado y binarización) y sirve para los dos intentos
+def leer_texto(imagen_cv, entidad, codigos):
+    plantilla = obtener_plantilla(entidad)
+    config = obtener_config_ocr(entidad)
+    imagen_ocr = preprocesar_para_ocr(imagen_cv, config.get('preprocesado'), DPI_POR_DEFECTO)
+    if plantilla:
+        # Los valores del código de barras tienen prioridad sobre el texto, así que solo se leen las regiones
+        # con algún campo que el código no completó (por ejemplo, el recuadro de totales suele no hacer falta)
+        faltantes = set(campos_faltantes(despachar_parser(entidad, '', codigos), requerir_iva=True))
+        regiones = [region for region in plantilla if faltantes.intersection(region['campos'])]
+        texto = aplicar_ocr_por_regiones(imagen_ocr, regiones, config['regiones'])
+        datos = despachar_parser(entidad, texto, codigos)
+        if not campos_faltantes(datos, requerir_iva=True):
+            return texto
+    return aplicar_ocr(imagen_ocr, config['pagina'])
+
+# Esta función levanta FacturaDuplicada si el código de barras ya está cargado según el índice en memoria,
+# para cortar el procesamiento antes del OCR y de la inserción
+def rechazar_si_cargada(datos):
+    codigo = datos.get('codigo_barra')
+    if codigo and REFERENCIAS.existe_codigo(codigo):
+        raise FacturaDuplicada(codigo)
+
+# Esta función convierte una página del PDF en imagen, lee los códigos de barras, clasifica el proveedor
+# y le aplica OCR
+def procesar_factura(pdf_path, pagina=1):
+    imagen_cv = convertir_a_opencv(convertir_pdf_a_imagen(pdf_path, pagina=pagina))
+    codigos = extraer_codigos_barras(imagen_cv)
+    entidad = clasificar_factura(codigos, imagen_cv=imagen_cv, nombre_archivo=nombre_pdf(pdf_path))
+    if entidad:
+        # El código de barras sale sin OCR: si ya está cargado no se lee el texto
+        rechazar_si_cargada(despachar_parser(entidad, '', codigos))
+    texto = leer_texto(imagen_cv, entidad, codigos)
+    # Si no hubo forma de clasificarla antes, el texto de la página completa es la última pista
+    entidad = entidad or clasificar_por_texto(texto)
+    # Devuelve el texto reconocido, la imagen procesada, los códigos encontrados y el proveedor
+    return texto, imagen_cv, codigos, entidad
+
+# Campos que tienen que estar completos para poder cargar la factura sin leer el texto de la página
+CAMPOS_OBLIGATORIOS = ('codigo_barra', 'cliente', 'monto', 'vencimiento', 'periodo')
+
+# Esta función devuelve la lista de campos que el parser no pudo completar
+def campos_faltantes(datos, requerir_iva=False):
+    faltantes = [campo for campo in CAMPOS_OBLIGATORIOS if not datos.get(campo)]
+    # La condición frente al IVA solo sale del texto, así que se exige únicamente si se pide
+    if requerir_iva and datos.get('condicion_iva') in (None, '', 'Desconocido'):
+        faltantes.append('condicion_iva')
+    return faltantes
+
+# Esta función calcula la clave de cache de una página de un PDF según su contenido y la configuración de OCR
+def clave_cache(cache, pdf_path, pagina=1):
+    contenido = leer_pdf(pdf_path)
+    # La página solo entra en la clave si no es la primera, así las entradas ya guardadas siguen sirviendo
+    por_pagina = {'pagina': pagina} if pagina != 1 else {}
+    return cache.clave(contenido, dpi=DPI_POR_DEFECTO, idioma=IDIOMA_OCR, plantillas=VERSION_PLANTILLAS,
+                       grises=ESCALA_DE_GRISES, **por_pagina)
+
+# Esta función lee primero los códigos de barras y aplica OCR solo si el parser no pudo completar todos los campos
+def procesar_factura_rapida(pdf_path, requerir_iva=False, cache=None, pagina=1):
+    nombre_archivo = nombre_pdf(pdf_path)
+
+    # Si el PDF ya se procesó antes, reutilizamos los códigos (y el texto, si se había leído)
+    clave = clave_cache(cache, pdf_path, pagina) if cache else None
+    entrada = (cache.obtener(clave) if cache else None) or {}
+    codigos = entrada.get('codigos')
+    texto = entrada.get('texto')
+    imagen_cv = None
+
+    if codigos is None:
+        imagen_cv = convertir_a_opencv(convertir_pdf_a_imagen(pdf_path, pagina=pagina))
+        codigos = extraer_codigos_barras(imagen_cv)
+    entidad = entrada.get('entidad') or clasificar_factura(codigos, imagen_cv, texto, nombre_archivo)
+
+    # Primer intento: parseamos con lo que tengamos (solo los códigos de barras si no hay texto)
+    datos = despachar_parser(entidad, texto or '', codigos) if entidad else {}
+    rechazar_si_cargada(datos)
+    if texto is None and (entidad is None or campos_faltantes(datos, requerir_iva)):
+        # Si falta algún campo, recién ahí pagamos el costo de Tesseract y volvemos a parsear
+        if imagen_cv is None:
+            imagen_cv = convertir_a_opencv(convertir_pdf_a_imagen(pdf_path, pagina=pagina))
+        config = obtener_config_ocr(entidad)
+        texto = aplicar_ocr(preprocesar_para_ocr(imagen_cv, config.get('preprocesado'), DPI_POR_DEFECTO),
+                            config['pagina'])
+        entidad = entidad or clasificar_por_texto(texto)
+        datos = despachar_parser(entidad, texto, codigos)
+
+    ruta = 'ocr' if texto is not None else 'codigo_barras'
+    if cache and entrada.get('codigos') is not None and entrada.get('texto') == texto:
+        ruta += '+cache'
+    elif cache:
+        cache.guardar(clave, {'codigos': codigos, 'texto': texto, 'entidad': entidad})
+    return datos, ruta
+
+# Esta función parsea un PDF digital usando su capa de texto; solo rasteriza si el código de barras
+# no aparece impreso en el texto y hay que decodificarlo desde la imagen
+def procesar_factura_digital(pdf_path, texto, pagina=1):
+    nombre_archivo = nombre_pdf(pdf_path)
+    codigos = buscar_codigos_en_texto(texto)
+    entidad = clasificar_factura(codigos, texto=texto, nombre_archivo=nombre_archivo)
+    datos = despachar_parser(entidad, texto, codigos) if entidad else {}
+    if datos.get('codigo_barra'):
+        return datos, 'texto_embebido'
+
+    imagen_cv = convertir_a_opencv(convertir_pdf_a_imagen(pdf_path, pagina=pagina))
     codigos = extraer_codigos_barras(imagen_cv)
-    # Devuelve el texto reconocido, la imagen procesada y los códigos encontrados
-    return texto, imagen_cv, codigos
-
-# Esta función elige qué parser usar según el nombre del archivo
-def despachar_parser(nombre_archivo, texto, codigos_barras):
-    nombre = nombre_archivo.lower()
-    if 'metrogas' in nombre:
-        return parsear_factura_metrogas(texto, codigos_barras)
-    elif 'edesur' in nombre:
-        return parsear_factura_edesur(texto, codigos_barras)
-    elif 'movistar' in nombre:
-        return parsear_factura_movistar(texto, codigos_barras)
+    entidad = entidad or clasificar_factura(codigos, imagen_cv, nombre_archivo=nombre_archivo)
+    datos = despachar_parser(entidad, texto, codigos)
+    return datos, 'texto_embebido+codigo_barras'
+
+# Esta función procesa y parsea una factura. Si el PDF trae capa de texto se usa directamente;
+# si no, se rasteriza y se aplica OCR (con el camino rápido si se pide)
+# `pagina` es la página donde empieza la factura (en los PDF que traen varias facturas)
+def extraer_datos_factura(pdf_path, rapido=False, requerir_iva=False, cache=None, usar_texto_embebido=True,
+                          pagina=1):
+    # Los tiempos de cada etapa se registran al terminar, etiquetados con el proveedor de la factura
+    with recolectar(), medir('total'):
+        return _extraer_datos_factura(pdf_path, rapido, requerir_iva, cache, usar_texto_embebido, pagina)
+
+def _extraer_datos_factura(pdf_path, rapido, requerir_iva, cache, usar_texto_embebido, pagina):
+    nombre_archivo = nombre_pdf(pdf_path)
+    texto_embebido = extraer_texto_embebido(pdf_path, pagina) if usar_texto_embebido else ''
+    if tiene_capa_de_texto(texto_embebido):
+        datos, ruta = procesar_factura_digital(pdf_path, texto_embebido, pagina)
+    elif rapido:
+        datos, ruta = procesar_factura_rapida(pdf_path, requerir_iva, cache, pagina)
     else:
+        clave = clave_cache(cache, pdf_path, pagina) if cache else None
+        entrada = cache.obtener(clave) if cache else None
+        if entrada and entrada.get('texto') is not None:
+            texto, codigos = entrada['texto'], entrada['codigos']
+            entidad = entrada.get('entidad') or clasificar_factura(codigos, texto=texto, nombre_archivo=nombre_archivo)
+            ruta = 'ocr+cache'
+        else:
+            texto, imagen_cv, codigos, entidad = procesar_factura(pdf_path, pagina)
+            ruta = 'ocr'
+            if cache:
+                cache.guardar(clave, {'codigos': codigos, 'texto': texto, 'entidad': entidad})
+        datos = despachar_parser(entidad, texto, codigos)
+    rechazar_si_cargada(datos)
+    datos['archivo'] = nombre_archivo if pagina == 1 else f'{nombre_archivo} (pág. {pagina})'
+    return datos, ruta
+
+# Parser que corresponde a cada proveedor
+PARSERS = {
+    'metrogas': parsear_factura_metrogas,
+    'edesur': parsear_factura_edesur,
+    'movistar': parsear_factura_movistar,
+}
+
+# Esta función ejecuta el parser del proveedor que determinó el clasificador
+def despachar_parser(entidad, texto, codigos_barras):
+    if entidad not in PARSERS:
         raise ValueError("No se encontró módulo para el tipo de factura.")
+    return PARSERS[entidad](texto, codigos_barras)
 
 # Esta función busca facturas en la base de datos filtrando por CUIL y, opcionalmente, por entidad
 def buscar_facturas_por_cuil(cursor, cuil, entidad_id=None):
+    columnas = ejecutar_busqueda_por_cuil(cursor, cuil, entidad_id)
+    resultados = cursor.fetchall()
+    # Convertimos cada fila en un diccionario con nombres de columnas
+    return [dict(zip(columnas, fila)) for fila in resultados]
+
+# Esta función devuelve el resumen de gastos de un CUIL (cantidad, total y último vencimiento por entidad
+# y período), leyendo la tabla ResumenGastos que se actualiza al insertar: no recorre las facturas
+def buscar_resumen_gastos(cursor, cuil, entidad_id=None):
+    query = """
+        SELECT r.entidad_id, e.nombre AS entidad, r.periodo, r.cantidad, r.total, r.ultimo_vencimiento
+        FROM ResumenGastos r
+        JOIN Entidades e ON e.ID = r.entidad_id
+        WHERE r.cuil = ?
+    """
+    params = [cuil]
+
+    if entidad_id:
+        query += " AND r.entidad_id = ?"
+        params.append(entidad_id)
+
+    query += " ORDER BY r.periodo DESC, e.nombre"
+
+    cursor.execute(query, params)
+    columnas = [column[0] for column in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+# Esta función busca una página de facturas por CUIL usando paginación por clave (vencimiento, id):
+# en lugar de OFFSET, cada página arranca después de la última fila de la anterior, así que el costo
+# no crece con el número de página. Devuelve las facturas y el cursor de la página siguiente (o None).
+def buscar_facturas_paginado(cursor, cuil, entidad_id=None, tamano_pagina=50, orden='desc', despues=None):
+    orden = 'ASC' if str(orden).lower() == 'asc' else 'DESC'
+    comparador = '>' if orden == 'ASC' else '<'
+
+    query = """
+        SELECT TOP (?) id, Archivo, Entidad_id, Codigo_Barra, Cliente, Monto, Vencimiento,
+               Periodo, Condicion_IVA, CUIL
+        FROM Facturas
+        WHERE CUIL = ?
+    """
+    # Pedimos una fila de más para saber si hay página siguiente
+    params = [tamano_pagina + 1, cuil]
+
+    if entidad_id:
+        query += " AND Entidad_id = ?"
+        params.append(entidad_id)
+
+    if despues:
+        # SQL Server ordena los NULL primero en ASC y al final en DESC: las facturas sin vencimiento forman
+        # un tramo propio (ordenado por id) antes o después de las que tienen fecha
+        vencimiento, ultimo_id = decodificar_cursor(despues)
+        if vencimiento is None:
+            condicion = f"Vencimiento IS NULL AND id {comparador} ?"
+            params.append(ultimo_id)
+            if orden == 'ASC':
+                condicion += " OR Vencimiento IS NOT NULL"
+        else:
+            condicion = f"Vencimiento {comparador} ? OR (Vencimiento = ? AND id {comparador} ?)"
+            params.extend([vencimiento, vencimiento, ultimo_id])
+            if orden == 'DESC':
+                condicion += " OR Vencimiento IS NULL"
+        query += f" AND ({condicion})"
+
+    query += f" ORDER BY Vencimiento {orden}, id {orden}"
+
+    cursor.execute(query, params)
+    columnas = [column[0] for column in cursor.description]
+    facturas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+    siguiente = None
+    if len(facturas) > tamano_pagina:
+        facturas = facturas[:tamano_pagina]
+        ultima = facturas[-1]
+        siguiente = codificar_cursor(ultima['Vencimiento'], ultima['id'])
+    return facturas, siguiente
+
+# Marca del cursor para una factura sin vencimiento
+CURSOR_SIN_VENCIMIENTO = 'nulo'
+
+# Esta función arma el cursor de paginación a partir de la última fila de una página
+def codificar_cursor(vencimiento, id_factura):
+    fecha = vencimiento.isoformat() if vencimiento is not None else CURSOR_SIN_VENCIMIENTO
+    return f"{fecha}_{id_factura}"
+
+# Esta función lee un cursor de paginación (el vencimiento es None si la factura no tenía);
+# si no es válido levanta ValueError
+def decodificar_cursor(valor):
+    fecha, _, id_factura = valor.partition('_')
+    vencimiento = None if fecha == CURSOR_SIN_VENCIMIENTO else date.fromisoformat(fecha)
+    return vencimiento, int(id_factura)
+
+# Esta función ejecuta la búsqueda de facturas por CUIL sin traer las filas y devuelve los nombres de las columnas
+def ejecutar_busqueda_por_cuil(cursor, cuil, entidad_id=None):
     query = """
         SELECT Archivo, Entidad_id, Codigo_Barra, Cliente, Monto, Vencimiento,
                Periodo, Condicion_IVA, CUIL
@@ -107,47 +546,294 @@ def buscar_facturas_por_cuil(cursor, cuil, entidad_id=None):
         params.append(entidad_id)
 
     cursor.execute(query, params)
-    columnas = [column[0] for column in cursor.description]
-    resultados = cursor.fetchall()
-    # Convertimos cada fila en un diccionario con nombres de columnas
-    return [dict(zip(columnas, fila)) for fila in resultados]
+    return [column[0] for column in cursor.description]
 
-# Función principal que coordina todo el flujo
-def main():
-    carpeta_facturas = 'facturas'  # Carpeta donde están los archivos PDF
-    facturas = cargar_facturas(carpeta_facturas)  # Cargamos todos los PDFs
+# Esta función recorre el resultado de una consulta ya ejecutada de a bloques, sin cargarlo entero en memoria
+def iterar_bloques(cursor, tamano_bloque=500):
+    while True:
+        filas = cursor.fetchmany(tamano_bloque)
+        if not filas:
+            return
+        yield filas
 
-    conn = conectar_sqlserver()  # Nos conectamos a la base de datos
-    try:
-        for factura in facturas:
-            try:
-                # Procesamos la factura: OCR, códigos de barras, etc.
-                texto, imagen_cv, codigos = procesar_factura(factura)
+# Esta función indica si una página trae el código de barras de algún proveedor, que es lo que marca
+# el comienzo de una factura dentro de un PDF escaneado con varias. Si la página tiene capa de texto
+# con el código impreso no hace falta rasterizarla
+def pagina_con_codigo(pdf_path, pagina):
+    texto = extraer_texto_embebido(pdf_path, pagina)
+    if tiene_capa_de_texto(texto) and clasificar_por_codigo(buscar_codigos_en_texto(texto)):
+        return True
+    imagen_cv = convertir_a_opencv(convertir_pdf_a_imagen(pdf_path, pagina=pagina))
+    return clasificar_por_codigo(extraer_codigos_barras(imagen_cv)) is not None
 
-                # Usamos el parser adecuado según el tipo de factura
-                datos = despachar_parser(os.path.basename(factura), texto, codigos)
+# Esta función devuelve la página donde empieza cada factura de un PDF. Las páginas se revisan de a una
+# (con `mapear` se pueden repartir entre procesos) y las que no traen código se consideran continuación
+# de la factura anterior
+def paginas_de_inicio(pdf_path, mapear=map):
+    total = contar_paginas(pdf_path)
+    if total <= 1:
+        return [1]
+    paginas = range(1, total + 1)
+    marcas = mapear(partial(pagina_con_codigo, pdf_path), paginas)
+    inicios = [pagina for pagina, tiene_codigo in zip(paginas, marcas) if tiene_codigo]
+    return inicios or [1]
 
-                # Agregamos el nombre del archivo al diccionario de datos
-                datos['archivo'] = os.path.basename(factura)
+# Esta función arma las tareas (archivo, página de inicio) a procesar. Sin `separar`, cada PDF es una
+# factura y solo se lee su primera página
+def armar_tareas(facturas, separar=False, mapear=map):
+    tareas = []
+    for factura in facturas:
+        try:
+            inicios = paginas_de_inicio(factura, mapear) if separar else [1]
+        except Exception as e:
+            # Si no se puede dividir, se procesa como una sola factura y el error se informa ahí
+            print(f'No se pudo dividir {factura} en facturas: {e}')
+            inicios = [1]
+        tareas.extend((factura, pagina) for pagina in inicios)
+    return tareas
 
-                print(f'\nFactura procesada: {factura}')
-                print(f'Datos extraídos: {datos}')
+# Esta función procesa una factura completa (pensada para correr dentro de un proceso del pool)
+# y nunca levanta excepciones: el error se devuelve para poder informarlo por archivo.
+# Los tiempos medidos también se devuelven, para registrarlos en el proceso principal
+def procesar_para_lote(tarea, rapido=False, requerir_iva=False, usar_cache=True, usar_texto_embebido=True):
+    pdf_path, pagina = tarea
+    factura = pdf_path if pagina == 1 else f'{pdf_path} (pág. {pagina})'
+    cache, antes = None, {}
+    with recolectar(reenviar=False) as recolector:
+        try:
+            cache = obtener_cache() if usar_cache else None
+            antes = cache.estadisticas() if cache else {}
+            datos, ruta = extraer_datos_factura(pdf_path, rapido, requerir_iva, cache, usar_texto_embebido, pagina)
+            resultado = factura, datos, ruta, None
+        except FacturaDuplicada as e:
+            resultado = factura, {'codigo_barra': e.codigo_barra}, 'duplicada', None
+        except Exception as e:
+            resultado = factura, None, None, str(e)
+    # Con --jobs cada proceso tiene su propia cache (y sus contadores), así que se devuelve lo que sumó
+    # esta factura a aciertos, fallos y desalojos para acumularlo en el proceso principal
+    uso_cache = Counter()
+    if cache and antes:
+        uso_cache.update({clave: valor - antes[clave] for clave, valor in cache.estadisticas().items()
+                          if clave != 'tamano'})
+    return resultado + (recolector.observaciones, uso_cache)
 
-                # Intentamos insertar los datos en la base
-                with conn.cursor() as cursor:
-                    inserted = insertar_factura(cursor, datos)
-                    if inserted:
-                        conn.commit()  # Confirmamos si fue insertada
-                        print('Factura cargada en la base de datos.\n')
-                    else:
-                        print(f'La factura con código de barra {datos["codigo_barra"]} ya fue cargada previamente.\n')
+# Esta función devuelve los resultados de cada factura en el mismo orden en que se recibieron.
+# Con `mapear` = pool.map se reparten el rasterizado, OCR, códigos de barras y parseo entre varios procesos
+def iterar_resultados(tareas, mapear=map, rapido=False, requerir_iva=False, usar_cache=True,
+                      usar_texto_embebido=True):
+    procesar = partial(procesar_para_lote, rapido=rapido, requerir_iva=requerir_iva,
+                       usar_cache=usar_cache, usar_texto_embebido=usar_texto_embebido)
+    # pool.map mantiene el orden de entrada aunque los procesos terminen en otro orden
+    yield from mapear(procesar, tareas)
 
-            except Exception as e:
+# Esta función inserta un lote de facturas ya parseadas y confirma todo con un único commit.
+# Cada elemento del lote es (factura, datos, archivo); `registrar` recibe el resultado de cada archivo
+# e `insertar` es la función de inserción del almacenamiento (ver abrir_almacenamiento)
+def cargar_lote(conn, lote, registrar=None, insertar=insertar_facturas_lote):
+    registrar = registrar or (lambda archivo, resultado, detalle=None: None)
+    try:
+        insertadas, duplicadas, errores = insertar(conn, [datos for _, datos, _ in lote])
+    except Exception as e:
+        for factura, _, archivo in lote:
+            print(f'Error cargando la factura {factura}: {e}')
+            registrar(archivo, 'error', str(e))
+        return 0
+
+    for orden in insertadas:
+        print(f'Factura cargada en la base de datos: {lote[orden][0]}')
+        registrar(lote[orden][2], 'cargada')
+    for orden in duplicadas:
+        print(f'La factura con código de barra {lote[orden][1]["codigo_barra"]} ya fue cargada previamente.')
+        registrar(lote[orden][2], 'duplicada')
+    for orden, error in errores:
+        print(f'Error cargando la factura {lote[orden][0]}: {error}')
+        registrar(lote[orden][2], 'error', error)
+    return len(insertadas)
+
+# Esta función procesa e inserta una lista de PDF. Con manifiesto, primero descarta los que no cambiaron
+# desde la última corrida y después registra el resultado de cada uno
+def ejecutar_carga(facturas, args, mapear=map, manifiesto=None):
+    if manifiesto:
+        total = len(facturas)
+        facturas = filtrar_pendientes(facturas, manifiesto, args.reintentar_errores)
+        print(f'{total - len(facturas)} archivos sin cambios desde la última corrida, {len(facturas)} para procesar')
+        registrar = manifiesto.registrar
+    else:
+        registrar = None
+    if not facturas:
+        return
+
+    inicio = time.perf_counter()
+    procesadas = 0
+    errores = 0
+    cargadas = 0
+    uso_cache = Counter()
+
+    conn, insertar = abrir_almacenamiento(args)  # Nos conectamos a la base de datos
+    try:
+        tareas = armar_tareas(facturas, args.separar, mapear)
+        # Etapa de escritura: un único consumidor que junta las facturas parseadas y las inserta por lotes
+        lote = []
+        resultados = iterar_resultados(tareas, mapear, args.rapido, args.requerir_iva,
+                                       not args.sin_cache, not args.sin_texto_embebido)
+        # Los resultados llegan en el mismo orden que las tareas
+        for (archivo, _), (factura, datos, ruta, error, observaciones, uso) in zip(tareas, resultados):
+            procesadas += 1
+            REGISTRO.combinar(observaciones)
+            uso_cache.update(uso)
+            if error:
                 # Si hubo algún error procesando la factura, lo mostramos
-                print(f'Error procesando la factura {factura}: {e}')
+                errores += 1
+                print(f'Error procesando la factura {factura}: {error}')
+                if manifiesto:
+                    manifiesto.registrar(archivo, 'error', error)
+                continue
+
+            if ruta == 'duplicada':
+                # El índice de códigos ya la conocía: no se aplicó OCR ni se fue a la base
+                print(f'La factura con código de barra {datos["codigo_barra"]} ya fue cargada previamente.')
+                if manifiesto:
+                    manifiesto.registrar(archivo, 'duplicada')
+                continue
+
+            print(f'\nFactura procesada: {factura} (vía {ruta})')
+            print(f'Datos extraídos: {datos}')
+
+            lote.append((factura, datos, archivo))
+            if len(lote) >= args.lote:
+                cargadas += cargar_lote(conn, lote, registrar, insertar)
+                lote = []
+
+        if lote:
+            cargadas += cargar_lote(conn, lote, registrar, insertar)
     finally:
         conn.close()  # Cerramos la conexión a la base de datos
 
+    duracion = time.perf_counter() - inicio
+    ritmo = procesadas / duracion if duracion > 0 else 0.0
+    print(f'\n{procesadas} facturas procesadas ({cargadas} cargadas, {errores} con error) '
+          f'en {duracion:.1f} s: {ritmo:.2f} facturas/s')
+    if not args.sin_cache:
+        print(f'Cache de OCR: {uso_cache["aciertos"]} aciertos, {uso_cache["fallos"]} fallos, '
+              f'{uso_cache["desalojos"]} desalojos')
+
+# Segundos que tiene que pasar un archivo sin modificarse para considerar que terminó de copiarse
+ESPERA_ARCHIVO_ESTABLE = 2
+
+# Esta función vigila la carpeta y procesa los PDF a medida que aparecen, hasta que se interrumpe (Ctrl+C).
+# Cada vuelta pasa por el manifiesto los archivos estables cuya firma (ruta, tamaño, fecha) no se revisó
+# todavía, así que un PDF reemplazado con el mismo nombre se vuelve a procesar. Las firmas revisadas se
+# recortan en cada vuelta a las de los archivos que siguen en la carpeta
+def vigilar_carpeta(args, mapear, manifiesto):
+    revisadas = set()
+    print(f'Vigilando {args.carpeta} cada {args.intervalo} s (Ctrl+C para terminar)')
+    while True:
+        ahora = time.time()
+        firmas = set()
+        candidatas = []
+        for factura in cargar_facturas(args.carpeta):
+            try:
+                estado = os.stat(factura)
+            except OSError:
+                continue
+            firma = (factura, estado.st_size, estado.st_mtime_ns)
+            firmas.add(firma)
+            # Los archivos que todavía se están copiando se toman en la vuelta siguiente
+            if firma not in revisadas and ahora - estado.st_mtime >= ESPERA_ARCHIVO_ESTABLE:
+                candidatas.append(firma)
+        revisadas &= firmas
+        if candidatas:
+            try:
+                # ejecutar_carga deja solo las que el manifiesto marca como nuevas o modificadas
+                ejecutar_carga([factura for factura, _, _ in candidatas], args, mapear, manifiesto)
+            except Exception as e:
+                # Un error de conexión no detiene la vigilancia: los archivos se reintentan en la vuelta siguiente
+                print(f'Error en la carga: {e}')
+            else:
+                revisadas.update(candidatas)
+        if args.sincronizar:
+            # También se reintenta cuando no hay archivos nuevos, por si el servidor volvió a estar disponible
+            subir_pendientes(args)
+        time.sleep(args.intervalo)
+
+# Función principal que coordina todo el flujo
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Carga masiva de facturas PDF en la base de datos.')
+    parser.add_argument('--carpeta', default='facturas', help='Carpeta donde están los archivos PDF')
+    parser.add_argument('--rapido', action='store_true',
+                        help='Lee primero los códigos de barras y aplica OCR solo si faltan campos')
+    parser.add_argument('--requerir-iva', action='store_true',
+                        help='En modo rápido, aplica OCR también para obtener la condición frente al IVA')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Cantidad de procesos que rasterizan, aplican OCR y parsean en paralelo')
+    parser.add_argument('--sin-cache', action='store_true',
+                        help='No usa la cache de OCR y códigos de barras')
+    parser.add_argument('--sin-texto-embebido', action='store_true',
+                        help='Ignora la capa de texto de los PDF digitales y aplica siempre OCR')
+    parser.add_argument('--lote', type=int, default=50,
+                        help='Cantidad de facturas que se insertan por cada commit')
+    parser.add_argument('--separar', action='store_true',
+                        help='Divide los PDF de varias páginas en facturas: cada página con código de barras '
+                             'empieza una nueva')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Saltea los archivos que no cambiaron desde la última corrida (usa el manifiesto)')
+    parser.add_argument('--manifiesto', default='.manifiesto_facturas.sqlite3',
+                        help='Archivo donde se registran los PDF procesados')
+    parser.add_argument('--reintentar-errores', action='store_true',
+                        help='En modo incremental, vuelve a procesar los archivos que terminaron con error')
+    parser.add_argument('--vigilar', action='store_true',
+                        help='Queda vigilando la carpeta y procesa los PDF nuevos a medida que llegan')
+    parser.add_argument('--intervalo', type=float, default=5,
+                        help='Segundos entre cada revisión de la carpeta en modo vigilancia')
+    parser.add_argument('--almacenamiento', choices=('sqlserver', 'sqlite'),
+                        default=os.environ.get('FACTURAI_ALMACENAMIENTO', 'sqlserver'),
+                        help='Base donde se cargan las facturas: SQL Server o una base SQLite local')
+    parser.add_argument('--base-local', default='facturai_local.sqlite3',
+                        help='Archivo de la base SQLite local')
+    parser.add_argument('--sincronizar', action='store_true',
+                        help='Con almacenamiento sqlite, sube a SQL Server las facturas cargadas localmente')
+    args = parser.parse_args(argv)
+    # La sincronización solo tiene sentido desde la base local
+    args.sincronizar = args.sincronizar and args.almacenamiento == 'sqlite'
+
+    # El manifiesto permite saltear los archivos ya procesados (siempre se usa al vigilar la carpeta)
+    manifiesto = Manifiesto(args.manifiesto) if args.incremental or args.vigilar else None
+
+    # Entidades y códigos de barras ya cargados: permiten descartar duplicados antes del OCR
+    try:
+        conn, _ = abrir_almacenamiento(args)
+        try:
+            REFERENCIAS.cargar(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f'No se pudo cargar el índice de códigos de barras (se controla solo al insertar): {e}')
+
+    # Con más de un job, el rasterizado, OCR y parseo (y la división de los PDF) corren en un pool de procesos;
+    # cada proceso arranca con una copia del índice
+    pool = ProcessPoolExecutor(max_workers=args.jobs, initializer=inicializar_referencias,
+                               initargs=(REFERENCIAS.exportar(),)) if args.jobs > 1 else None
+    mapear = pool.map if pool else map
+
+    try:
+        if args.vigilar:
+            vigilar_carpeta(args, mapear, manifiesto)
+        else:
+            ejecutar_carga(cargar_facturas(args.carpeta), args, mapear, manifiesto)
+            if args.sincronizar:
+                subir_pendientes(args)
+    except KeyboardInterrupt:
+        print('\nCarga interrumpida.')
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        if manifiesto:
+            manifiesto.cerrar()
+
+    # Tiempos por etapa (en ms): permite ver si el cuello de botella es el rasterizado, el OCR, etc.
+    print('\nTiempos por etapa (ms):')
+    print(REGISTRO.resumen())
+
 # Este bloque se ejecuta si el script se corre directamente
 if __name__ == "__main__":
     main()
@@ -0,0 +1,347 @@
+import re
+from datetime import datetime
+
+# Motor de extracción compartido por los parsers de cada proveedor.
+#
+# Cada proveedor se describe con una especificación declarativa (un diccionario):
+#   - 'entidad_id': id fijo de la entidad en la base.
+#   - 'codigo_barras': qué código de barras usar ('largo_minimo') y qué porción
+#     del código corresponde a cada campo ('campos'), más los campos que se
+#     calculan a partir de otros ('derivados').
+#   - 'campos': para cada campo, la lista ordenada de reglas que se prueban sobre
+#     el texto cuando el código de barras no lo completó.
+#
+# Al compilar una especificación cada regla queda con su expresión regular
+# compilada y con su "ancla": el texto literal con el que empieza toda
+# coincidencia (por ejemplo 'vencimiento' o 'total'). Las búsquedas que ignoran
+# mayúsculas son las caras para el motor de regex (no puede saltar directo al
+# prefijo), así que el texto se pasa a minúsculas una sola vez por factura, las
+# anclas se buscan con una búsqueda de texto plano y la expresión completa solo
+# se prueba en esas posiciones. Además solo se evalúan las reglas de los campos
+# que siguen vacíos, hasta la primera que da un valor válido. El resultado es el
+# mismo que con re.search regla por regla.
+
+# ---------------------------------------------------------------------------
+# Normalizadores: reciben el texto (o el match) y devuelven el valor, o None si
+# no es válido y hay que probar con la regla siguiente.
+# ---------------------------------------------------------------------------
+
+# Devuelve la porción del código si son todos dígitos
+def solo_digitos(valor):
+    return valor if valor.isdigit() else None
+
+# Convierte un importe expresado en centavos a formato decimal con 2 decimales
+def centavos(valor):
+    return "{:.2f}".format(int(valor) / 100) if valor.isdigit() else None
+
+# Convierte un importe entero (con ceros a la izquierda) a formato decimal con 2 decimales
+def pesos_enteros(valor):
+    valor = valor.lstrip('0')
+    return "{:.2f}".format(int(valor)) if valor.isdigit() else None
+
+# Devuelve un normalizador que lee una fecha con el formato indicado y la devuelve como DD/MM/AAAA
+def fecha(formato):
+    def normalizar(valor):
+        try:
+            return datetime.strptime(valor, formato).strftime("%d/%m/%Y")
+        except ValueError:
+            return None
+    return normalizar
+
+# Lee una fecha DDMMAAAA de ocho dígitos, la valida y la devuelve como DD/MM/AAAA
+def fecha_ddmmaaaa(valor):
+    if len(valor) != 8 or not valor.isdigit():
+        return None
+    fecha_str = f"{valor[0:2]}/{valor[2:4]}/{valor[4:8]}"
+    try:
+        datetime.strptime(fecha_str, "%d/%m/%Y")
+    except ValueError:
+        return None
+    return fecha_str
+
+# Calcula el periodo (MM/AAAA) como el mes anterior a la fecha de vencimiento (DD/MM/AAAA)
+def periodo_desde_vencimiento(fecha_vencimiento_str):
+    try:
+        fecha_venc = datetime.strptime(fecha_vencimiento_str, "%d/%m/%Y")
+    except (ValueError, TypeError):
+        return None
+    mes = fecha_venc.month
+    anio = fecha_venc.year
+    # Si el vencimiento es en enero, el periodo será diciembre del año anterior
+    if mes == 1:
+        return f"12/{anio - 1}"
+    return f"{mes - 1:02d}/{anio}"
+
+# Devuelve un normalizador que toma un grupo del match (limpiando espacios)
+def grupo(numero=1):
+    def normalizar(match):
+        return match.group(numero).strip()
+    return normalizar
+
+# Devuelve un normalizador que ignora el match y devuelve siempre el mismo valor
+def constante(valor):
+    def normalizar(match):
+        return valor
+    return normalizar
+
+# Toma una fecha del texto (DD/MM/AAAA o DD-MM-AAAA) y la valida
+def fecha_texto(numero=1):
+    def normalizar(match):
+        fecha_str = match.group(numero).replace('-', '/')
+        try:
+            datetime.strptime(fecha_str, "%d/%m/%Y")
+        except ValueError:
+            return None
+        return fecha_str
+    return normalizar
+
+# Toma un importe del texto con separadores de miles y coma decimal y lo pasa a formato decimal
+def monto_texto(numero=1):
+    def normalizar(match):
+        monto_str = match.group(numero).replace('.', '').replace(',', '.')
+        try:
+            return "{:.2f}".format(float(monto_str))
+        except ValueError:
+            return None
+    return normalizar
+
+# Devuelve un normalizador que busca dentro del grupo alguna de las claves del mapeo.
+# Si no encuentra ninguna, devuelve el texto limpio y capitalizado (o None si `limpiar` es False).
+def mapear(mapeo, numero=1, primera_linea=False, limpiar=True):
+    def normalizar(match):
+        cond = match.group(numero).strip()
+        if primera_linea:
+            cond = cond.lower().split('\n')[0]
+        cond_lower = cond.lower()
+        for clave, valor in mapeo:
+            if clave in cond_lower:
+                return valor
+        if not limpiar:
+            return None
+        # Limpia caracteres no alfabéticos y capitaliza
+        return re.sub(r'[^a-zA-Z\s]', '', cond).strip().title()
+    return normalizar
+
+
+# ---------------------------------------------------------------------------
+# Reglas de las especificaciones
+# ---------------------------------------------------------------------------
+
+# Regla sobre el texto: una expresión regular y cómo convertir su coincidencia en valor.
+# `anclas` indica los textos literales con los que puede empezar una coincidencia; si no
+# se indican, se deducen del comienzo del patrón.
+def regla(patron, normalizar=None, ignorar_mayusculas=True, anclas=None):
+    return {
+        'tipo': 'regex',
+        'patron': patron,
+        'normalizar': normalizar or grupo(1),
+        'ignorar_mayusculas': ignorar_mayusculas,
+        'anclas': anclas,
+    }
+
+# Regla que calcula el campo a partir de otro campo ya extraído
+def derivar(origen, funcion):
+    return {'tipo': 'derivado', 'origen': origen, 'funcion': funcion}
+
+# Regla que asigna un valor fijo cuando ninguna de las anteriores dio resultado
+def defecto(valor):
+    return {'tipo': 'defecto', 'valor': valor}
+
+
+# ---------------------------------------------------------------------------
+# Motor
+# ---------------------------------------------------------------------------
+
+# Largo mínimo de un ancla; con menos caracteres hay demasiadas posiciones candidatas
+LARGO_MINIMO_ANCLA = 2
+
+# Escapes que representan un único carácter literal
+_ESCAPES_LITERALES = set('.$^*+?()[]{}|\\/- :')
+
+# Deduce el texto literal con el que empieza toda coincidencia del patrón. Devuelve solo la parte ASCII
+# en minúsculas (como bytes, ver `_minusculas`), o None si es demasiado corta
+def deducir_ancla(patron):
+    if _tiene_alternativas(patron):
+        return None
+    ancla = []
+    i = 0
+    while i < len(patron):
+        c = patron[i]
+        if c == '\\' and i + 1 < len(patron) and patron[i + 1] in _ESCAPES_LITERALES:
+            literal, avance = patron[i + 1], 2
+        elif c in '.^$*+?()[]{}|\\':
+            break
+        else:
+            literal, avance = c, 1
+        # Si el carácter lleva un cuantificador, puede no estar (o repetirse): el ancla termina antes
+        siguiente = patron[i + avance:i + avance + 1]
+        if siguiente and siguiente in '?*{':
+            break
+        ancla.append(literal)
+        if siguiente == '+':
+            break
+        i += avance
+    return _ancla_ascii(''.join(ancla))
+
+# Recorta el ancla en su primer carácter no ASCII (las mayúsculas acentuadas no se pasan a minúsculas
+# en `_minusculas`) y la devuelve en minúsculas como bytes
+def _ancla_ascii(ancla):
+    corte = next((i for i, c in enumerate(ancla) if ord(c) > 127), len(ancla))
+    ancla = ancla[:corte].lower()
+    return ancla.encode('ascii') if len(ancla) >= LARGO_MINIMO_ANCLA else None
+
+# Pasa el texto a minúsculas ASCII conservando las posiciones: cada carácter ocupa un byte
+# (los que no existen en latin-1 se reemplazan por '?'). Es varias veces más rápido que str.lower()
+def _minusculas(texto):
+    return texto.encode('latin-1', 'replace').lower()
+
+# Indica si el patrón tiene alternativas (|) fuera de grupos y clases de caracteres
+def _tiene_alternativas(patron):
+    profundidad = 0
+    en_clase = False
+    i = 0
+    while i < len(patron):
+        c = patron[i]
+        if c == '\\':
+            i += 2
+            continue
+        if en_clase:
+            en_clase = c != ']'
+        elif c == '[':
+            en_clase = True
+        elif c == '(':
+            profundidad += 1
+        elif c == ')':
+            profundidad -= 1
+        elif c == '|' and profundidad == 0:
+            return True
+        i += 1
+    return False
+
+
+class ExtractorCompilado:
+    """
+    Especificación de un proveedor ya compilada, lista para extraer datos.
+    """
+
+    def __init__(self, espec):
+        self.entidad_id = espec['entidad_id']
+        self.codigo_barras = espec.get('codigo_barras', {})
+        self.campos = []
+
+        for campo, reglas in espec.get('campos', []):
+            compiladas = []
+            for r in reglas:
+                r = dict(r)
+                if r['tipo'] == 'regex':
+                    flags = re.IGNORECASE if r['ignorar_mayusculas'] else 0
+                    r['regex'] = re.compile(r['patron'], flags)
+                    if not r['ignorar_mayusculas']:
+                        # Con patrones sensibles a mayúsculas re.search ya busca el prefijo literal
+                        # sin pasar por el motor de regex, así que no hace falta ancla
+                        r['anclas'] = ()
+                    elif r['anclas'] is None:
+                        ancla = deducir_ancla(r['patron'])
+                        r['anclas'] = (ancla,) if ancla else ()
+                    else:
+                        r['anclas'] = tuple(a for a in map(_ancla_ascii, r['anclas']) if a)
+                compiladas.append(r)
+            self.campos.append((campo, compiladas))
+
+    def buscar_codigo(self, codigos_barras):
+        """
+        Devuelve el primer código de barras que cumple con la especificación, o None.
+        """
+        largo_minimo = self.codigo_barras.get('largo_minimo', 0)
+        return next((c for c in codigos_barras if c.isdigit() and len(c) >= largo_minimo), None)
+
+    def extraer_de_codigo(self, codigo):
+        """
+        Extrae los campos embebidos en el código de barras.
+
+        Returns:
+            dict: Todos los campos del código, con None en los que no se pudieron leer.
+        """
+        datos = {}
+        for campo, (inicio, fin), normalizar in self.codigo_barras.get('campos', []):
+            datos[campo] = normalizar(codigo[inicio:fin])
+        for campo, origen, funcion in self.codigo_barras.get('derivados', []):
+            datos[campo] = funcion(datos[origen]) if datos.get(origen) else None
+        return datos
+
+    def extraer(self, texto, codigos_barras):
+        """
+        Extrae los datos de una factura a partir del texto y los códigos de barras.
+
+        Args:
+            texto (str): Texto de la factura (puede estar vacío).
+            codigos_barras (list): Códigos de barras decodificados.
+
+        Returns:
+            dict: Datos extraídos.
+        """
+        datos = {'entidad_id': self.entidad_id}
+
+        codigo = self.buscar_codigo(codigos_barras)
+        if codigo:
+            datos['codigo_barra'] = codigo
+            datos.update({k: v for k, v in self.extraer_de_codigo(codigo).items() if v is not None})
+
+        texto_min = None
+        for campo, reglas in self.campos:
+            if datos.get(campo):
+                continue
+            valor = None
+            for r in reglas:
+                if r['tipo'] == 'regex':
+                    if texto_min is None and r['anclas']:
+                        # Se pasa a minúsculas una sola vez por factura
+                        texto_min = _minusculas(texto)
+                    match = self._buscar(r, texto, texto_min)
+                    valor = r['normalizar'](match) if match else None
+                elif r['tipo'] == 'derivado':
+                    valor = r['funcion'](datos[r['origen']]) if datos.get(r['origen']) else None
+                else:
+                    valor = r['valor']
+                if valor is not None:
+                    break
+            if valor:
+                datos[campo] = valor
+        return datos
+
+    @staticmethod
+    def _buscar(r, texto, texto_min):
+        # Sin anclas se usa la búsqueda normal
+        anclas = r['anclas']
+        if not anclas:
+            return r['regex'].search(texto)
+
+        # Primera coincidencia de la regla: se prueban en orden las posiciones donde aparece alguna ancla
+        regex = r['regex']
+        if len(anclas) == 1:
+            ancla = anclas[0]
+            pos = texto_min.find(ancla)
+            while pos >= 0:
+                match = regex.match(texto, pos)
+                if match:
+                    return match
+                pos = texto_min.find(ancla, pos + 1)
+            return None
+
+        siguientes = {ancla: texto_min.find(ancla) for ancla in anclas}
+        while True:
+            candidatas = [pos for pos in siguientes.values() if pos >= 0]
+            if not candidatas:
+                return None
+            pos = min(candidatas)
+            match = regex.match(texto, pos)
+            if match:
+                return match
+            for ancla, p in siguientes.items():
+                if p == pos:
+                    siguientes[ancla] = texto_min.find(ancla, pos + 1)
+
+
+# Compila una especificación de proveedor
+def compilar(espec):
+    return ExtractorCompilado(espec)
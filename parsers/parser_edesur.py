@@ -1,145 +1,67 @@
-import re
-from datetime import datetime
+from utils.metricas import cronometrado
+from parsers.motor import (
+    compilar, regla, defecto, mapear, constante, grupo, monto_texto,
+    solo_digitos, centavos, fecha, periodo_desde_vencimiento
+)
+
+# Condiciones frente al IVA que se aceptan cuando aparecen junto al CUIT o a "Condición IVA"
+CONDICIONES_VALIDAS = [
+    (condicion, condicion.title()) for condicion in (
+        "consumidor final",
+        "monotributista",
+        "responsable inscripto",
+        "exento",
+        "no responsable",
+        "sujeto no categorizado"
+    )
+]
+
+# Especificación de la factura de Edesur
+ESPEC_EDESUR = {
+    'entidad_id': 1,  # ID fijo para Edesur
+    'codigo_barras': {
+        # Código de barras largo (más de 40 dígitos)
+        'largo_minimo': 41,
+        'campos': [
+            ('cliente', (5, 13), solo_digitos),         # número de cliente
+            ('monto', (13, 24), centavos),              # monto de la factura en centavos
+            ('vencimiento', (24, 30), fecha("%y%m%d")), # fecha de vencimiento AAMMDD
+        ],
+        # El período es el mes anterior al vencimiento
+        'derivados': [('periodo', 'vencimiento', periodo_desde_vencimiento)],
+    },
+    'campos': [
+        ('cliente', [regla(r'cliente:?\s*(\d+)')]),
+        ('vencimiento', [regla(r'1º\s*Vencimiento\s*\(?(\d{2}/\d{2}/\d{4})\)?', ignorar_mayusculas=False)]),
+        ('monto', [
+            regla(r'Total\s*\$?\s*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2}))', monto_texto(), ignorar_mayusculas=False)
+        ]),
+        ('periodo', [regla(r'Periodo.*?(\d{1,2}/\d{4})', grupo(), ignorar_mayusculas=False)]),
+        ('condicion_iva', [
+            # Texto como "CUIT: Consumidor Final"
+            regla(r'CUIT:\s*([A-Za-z\s]+)', mapear(CONDICIONES_VALIDAS, primera_linea=True, limpiar=False)),
+            # "Curr" (lectura habitual del OCR) o "Condición IVA"
+            regla(r'(?:Curr|Condición\s*IVA):?\s*([A-Za-z\s\n]+)',
+                  mapear(CONDICIONES_VALIDAS, primera_linea=True, limpiar=False), anclas=('curr', 'condición')),
+            # Último intento genérico: la condición en cualquier parte del texto
+            regla(r"responsable\s+inscripto", constante("Responsable Inscripto")),
+            regla(r"monotributista", constante("Monotributista")),
+            regla(r"exento", constante("Exento")),
+            regla(r"consumidor\s+final", constante("Consumidor Final")),
+            regla(r"no\s+responsable", constante("No Responsable")),
+            regla(r"sujeto\s+no\s+categorizado", constante("Sujeto no Categorizado")),
+            defecto("Desconocido"),
+        ]),
+    ],
+}
+
+_extractor = compilar(ESPEC_EDESUR)
 
 # Función que extrae datos del código de barras largo de una factura de Edesur
 def extraer_datos_codigo_edesur(codigo):
-    # Diccionario inicial con campos vacíos
-    datos = {
-        'cliente': None,
-        'monto': None,
-        'vencimiento': None,
-        'periodo': None
-    }
-
-    try:
-        # Extrae el número de cliente (posiciones 6 a 13 del código)
-        cliente = codigo[5:13]
-        if cliente.isdigit():
-            datos['cliente'] = cliente
-
-        # Extrae el monto de la factura (posiciones 14 a 24 del código)
-        monto_str = codigo[13:24]
-        if monto_str.isdigit():
-            datos['monto'] = "{:.2f}".format(int(monto_str) / 100)  # Convierte a decimal con 2 decimales
-
-        # Extrae la fecha de vencimiento (posiciones 25 a 30 del código)
-        fecha_str = codigo[24:30]
-        try:
-            fecha_venc = datetime.strptime(fecha_str, "%y%m%d")
-            datos['vencimiento'] = fecha_venc.strftime("%d/%m/%Y")
-
-            # Calcula el período como el mes anterior al vencimiento
-            año = fecha_venc.year
-            mes = fecha_venc.month
-            if mes == 1:
-                mes_periodo = 12
-                año_periodo = año - 1
-            else:
-                mes_periodo = mes - 1
-                año_periodo = año
-            datos['periodo'] = f"{mes_periodo:02d}/{año_periodo}"
-        except:
-            pass  # Ignora errores en la conversión de fecha
-    except:
-        pass  # Ignora errores generales
-
-    return datos
-
-# Función auxiliar para identificar la condición frente al IVA a partir de texto
-def extraer_condicion_iva(texto):
-    texto = texto.lower()
-
-    # Diccionario de patrones de texto que se corresponden con condiciones fiscales
-    patrones = {
-        "Responsable Inscripto": r"responsable\s+inscripto",
-        "Monotributista": r"monotributista",
-        "Exento": r"exento",
-        "Consumidor Final": r"consumidor\s+final",
-        "No Responsable": r"no\s+responsable",
-        "Sujeto no Categorizado": r"sujeto\s+no\s+categorizado"
-    }
-
-    # Recorre los patrones y devuelve la condición encontrada
-    for condicion, patron in patrones.items():
-        if re.search(patron, texto):
-            return condicion
-    return "Desconocido"  # Si no encuentra coincidencias
+    return _extractor.extraer_de_codigo(codigo)
 
 # Función principal que parsea una factura de Edesur a partir del texto extraído y códigos de barra
+@cronometrado('parser', entidad='edesur')
 def parsear_factura_edesur(texto, codigos_barras):
-    datos = {}
-
-    datos['entidad_id'] = 1  # ID fijo para Edesur
-
-    # Busca un código de barras largo (más de 40 dígitos)
-    codigo_largo = next((c for c in codigos_barras if c.isdigit() and len(c) > 40), None)
-
-    # Si se encuentra un código válido, se extraen los datos
-    if codigo_largo:
-        datos_codigo = extraer_datos_codigo_edesur(codigo_largo)
-        datos.update({k: v for k, v in datos_codigo.items() if v is not None})
-        datos['codigo_barra'] = codigo_largo  
-
-    # Si no se pudo extraer el número de cliente desde el código, se intenta desde el texto
-    if not datos.get('cliente'):
-        match = re.search(r'(?i)cliente:?\s*(\d+)', texto)
-        if match:
-            datos['cliente'] = match.group(1).strip()
-
-    # Si no se pudo extraer la fecha de vencimiento, se intenta buscarla en el texto
-    if not datos.get('vencimiento'):
-        match = re.search(r'1º\s*Vencimiento\s*\(?(\d{2}/\d{2}/\d{4})\)?', texto)
-        if match:
-            datos['vencimiento'] = match.group(1).strip()
-
-    # Si no se pudo extraer el monto, se intenta buscarlo en el texto
-    if not datos.get('monto'):
-        match = re.search(r'Total\s*\$?\s*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2}))', texto)
-        if match:
-            monto_str = match.group(1).replace('.', '').replace(',', '.')
-            try:
-                datos['monto'] = "{:.2f}".format(float(monto_str))
-            except:
-                pass  # Ignora errores de conversión
-
-    # Si no se pudo extraer el período, se intenta buscarlo en el texto
-    if not datos.get('periodo'):
-        match = re.search(r'Periodo.*?(\d{1,2}/\d{4})', texto)
-        if match:
-            datos['periodo'] = match.group(1)
-
-    # Si no se pudo extraer la condición frente al IVA, se intenta encontrar en el texto
-    if not datos.get('condicion_iva'):
-        condiciones_validas = [
-            "consumidor final",
-            "monotributista",
-            "responsable inscripto",
-            "exento",
-            "no responsable",
-            "sujeto no categorizado"
-        ]
-
-        # Busca texto como "CUIT: Consumidor Final"
-        match = re.search(r'CUIT:\s*([A-Za-z\s]+)', texto, re.IGNORECASE)
-        if match:
-            posible_condicion = match.group(1).strip().lower().split('\n')[0]
-            for condicion in condiciones_validas:
-                if condicion in posible_condicion:
-                    datos['condicion_iva'] = condicion.title()
-                    break
-
-        # Si no se encontró, intenta con "Curr" o "Condición IVA"
-        if not datos.get('condicion_iva'):
-            match = re.search(r'(?i)(?:Curr|Condición\s*IVA):?\s*([A-Za-z\s\n]+)', texto)
-            if match:
-                posible_condicion = match.group(1).strip().lower().split('\n')[0]
-                for condicion in condiciones_validas:
-                    if condicion in posible_condicion:
-                        datos['condicion_iva'] = condicion.title()
-                        break
-
-    # Último intento genérico para obtener la condición IVA
-    if not datos.get('condicion_iva'):
-        datos['condicion_iva'] = extraer_condicion_iva(texto)
-
-    return datos  # Devuelve todos los datos extraídos en forma de diccionario
+    return _extractor.extraer(texto, codigos_barras)
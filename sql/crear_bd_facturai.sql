@@ -60,3 +60,39 @@ BEGIN
     PRINT 'La tabla Facturas ya existe.';
 END
 GO
+
+-- Índice de cobertura para la búsqueda paginada por CUIL (y opcionalmente entidad), ordenada por vencimiento
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Facturas_Cuil_Entidad_Vencimiento' AND object_id = OBJECT_ID('Facturas'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_Facturas_Cuil_Entidad_Vencimiento
+    ON Facturas (cuil, entidad_id, vencimiento, id)
+    INCLUDE (archivo, codigo_barra, cliente, monto, periodo, condicion_iva, fecha_carga);
+    PRINT 'Índice IX_Facturas_Cuil_Entidad_Vencimiento creado correctamente.';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Facturas_Cuil_Entidad_Vencimiento ya existe.';
+END
+GO
+
+-- Resumen de gastos por (cuil, entidad, período): lo actualizan insertar_factura e insertar_facturas_lote
+-- en la misma transacción que la factura, así /resumen no tiene que recorrer Facturas
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ResumenGastos' AND xtype='U')
+BEGIN
+    CREATE TABLE ResumenGastos (
+        cuil CHAR(11) NOT NULL,
+        entidad_id INT NOT NULL,
+        periodo DATE NOT NULL,
+        cantidad INT NOT NULL,
+        total DECIMAL(18,2) NOT NULL,
+        ultimo_vencimiento DATE,
+        CONSTRAINT PK_ResumenGastos PRIMARY KEY (cuil, entidad_id, periodo),
+        CONSTRAINT FK_ResumenGastos_Entidades FOREIGN KEY (entidad_id) REFERENCES Entidades(ID)
+    );
+    PRINT 'Tabla ResumenGastos creada correctamente.';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla ResumenGastos ya existe.';
+END
+GO
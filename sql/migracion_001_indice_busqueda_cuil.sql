@@ -0,0 +1,19 @@
+-- Migración 001: índice de cobertura para la búsqueda de facturas por CUIL
+-- Permite que /buscar_facturas (paginado por vencimiento e id) y /descargar_facturas
+-- resuelvan con un seek sobre el índice, sin recorrer la tabla Facturas.
+USE FacturAI_DB;
+GO
+
+-- Índice de cobertura para la búsqueda paginada por CUIL (y opcionalmente entidad), ordenada por vencimiento
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_Facturas_Cuil_Entidad_Vencimiento' AND object_id = OBJECT_ID('Facturas'))
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_Facturas_Cuil_Entidad_Vencimiento
+    ON Facturas (cuil, entidad_id, vencimiento, id)
+    INCLUDE (archivo, codigo_barra, cliente, monto, periodo, condicion_iva, fecha_carga);
+    PRINT 'Índice IX_Facturas_Cuil_Entidad_Vencimiento creado correctamente.';
+END
+ELSE
+BEGIN
+    PRINT 'El índice IX_Facturas_Cuil_Entidad_Vencimiento ya existe.';
+END
+GO
@@ -0,0 +1,42 @@
+-- Migración 002: resumen de gastos por CUIL, entidad y período
+-- Crea la tabla ResumenGastos y la completa con las facturas ya cargadas. Desde entonces la mantienen
+-- al día insertar_facturas_lote (main.py) y la base local de SQLite, así /resumen responde con un seek por CUIL
+-- sin importar cuántas facturas haya. No se usa una vista indexada porque no admiten MAX() (el último
+-- vencimiento). Ejecutarla con la carga de facturas detenida, para que la carga inicial no se superponga
+-- con inserciones nuevas.
+USE FacturAI_DB;
+GO
+
+-- Resumen de gastos por (cuil, entidad, período): lo actualizan insertar_factura e insertar_facturas_lote
+-- en la misma transacción que la factura, así /resumen no tiene que recorrer Facturas
+IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='ResumenGastos' AND xtype='U')
+BEGIN
+    CREATE TABLE ResumenGastos (
+        cuil CHAR(11) NOT NULL,
+        entidad_id INT NOT NULL,
+        periodo DATE NOT NULL,
+        cantidad INT NOT NULL,
+        total DECIMAL(18,2) NOT NULL,
+        ultimo_vencimiento DATE,
+        CONSTRAINT PK_ResumenGastos PRIMARY KEY (cuil, entidad_id, periodo),
+        CONSTRAINT FK_ResumenGastos_Entidades FOREIGN KEY (entidad_id) REFERENCES Entidades(ID)
+    );
+    PRINT 'Tabla ResumenGastos creada correctamente.';
+END
+ELSE
+BEGIN
+    PRINT 'La tabla ResumenGastos ya existe.';
+END
+GO
+
+-- Carga inicial a partir de las facturas existentes (solo si la tabla está vacía, para poder repetir el script)
+IF NOT EXISTS (SELECT 1 FROM ResumenGastos)
+BEGIN
+    INSERT INTO ResumenGastos (cuil, entidad_id, periodo, cantidad, total, ultimo_vencimiento)
+    SELECT cuil, entidad_id, TRY_CONVERT(DATE, periodo), COUNT(*), SUM(ISNULL(monto, 0)), MAX(vencimiento)
+    FROM Facturas
+    WHERE cuil IS NOT NULL AND TRY_CONVERT(DATE, periodo) IS NOT NULL
+    GROUP BY cuil, entidad_id, TRY_CONVERT(DATE, periodo);
+    PRINT 'Tabla ResumenGastos completada con las facturas existentes.';
+END
+GO
@@ -0,0 +1,173 @@
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+# Base SQLite para los puestos de carga que trabajan sin conexión a SQL Server (y para los benchmarks).
+# Tiene las mismas tablas Entidades, Facturas y ResumenGastos que sql/crear_bd_facturai.sql, con la misma
+# regla de unicidad sobre codigo_barra. Facturas suma la columna `sincronizada`, que marca las filas
+# que ya se subieron al servidor (ver main.sincronizar).
+
+SQL_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS Entidades (
+    ID INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    cuit TEXT NOT NULL,
+    condicion_iva TEXT NOT NULL
+);
+
+-- La FK se declara como en SQL Server pero SQLite no la controla (no se activa PRAGMA foreign_keys):
+-- un puesto sin conexión puede cargar facturas antes de haber bajado las entidades
+CREATE TABLE IF NOT EXISTS Facturas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    archivo TEXT NOT NULL,
+    entidad_id INTEGER NOT NULL REFERENCES Entidades (ID),
+    cliente TEXT,
+    cuil TEXT,
+    monto NUMERIC,
+    vencimiento DATE,
+    periodo DATE,
+    condicion_iva TEXT,
+    codigo_barra TEXT UNIQUE,
+    fecha_carga DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sincronizada INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS IX_Facturas_Cuil_Entidad_Vencimiento ON Facturas (cuil, entidad_id, vencimiento, id);
+CREATE INDEX IF NOT EXISTS IX_Facturas_Pendientes ON Facturas (id) WHERE sincronizada = 0;
+
+CREATE TABLE IF NOT EXISTS ResumenGastos (
+    cuil TEXT NOT NULL,
+    entidad_id INTEGER NOT NULL,
+    periodo DATE NOT NULL,
+    cantidad INTEGER NOT NULL,
+    total NUMERIC NOT NULL,
+    ultimo_vencimiento DATE,
+    PRIMARY KEY (cuil, entidad_id, periodo)
+);
+"""
+
+# Solo se ignora el choque con el UNIQUE de codigo_barra (INSERT OR IGNORE también ocultaría otros errores)
+SQL_INSERTAR_FACTURA = """
+INSERT INTO Facturas (archivo, entidad_id, cliente, monto, vencimiento, periodo, condicion_iva, codigo_barra, cuil)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (codigo_barra) DO NOTHING
+"""
+
+SQL_SUMAR_RESUMEN = """
+INSERT INTO ResumenGastos (cuil, entidad_id, periodo, cantidad, total, ultimo_vencimiento)
+VALUES (?, ?, ?, 1, COALESCE(?, 0), ?)
+ON CONFLICT (cuil, entidad_id, periodo) DO UPDATE SET
+    cantidad = cantidad + 1,
+    total = total + excluded.total,
+    ultimo_vencimiento = CASE WHEN ultimo_vencimiento IS NULL OR excluded.ultimo_vencimiento > ultimo_vencimiento
+                              THEN excluded.ultimo_vencimiento ELSE ultimo_vencimiento END
+"""
+
+
+def conectar_sqlite(ruta='facturai_local.sqlite3'):
+    """
+    Abre (o crea) la base local.
+
+    Args:
+        ruta (str): Archivo de la base, o ':memory:' para una base en memoria.
+
+    Returns:
+        sqlite3.Connection: Conexión con el esquema creado.
+    """
+    conn = sqlite3.connect(ruta)
+    # WAL: las lecturas (por ejemplo, la sincronización) no bloquean la carga, y cada commit escribe
+    # solo el registro en lugar de reescribir páginas de la base
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SQL_ESQUEMA)
+    return conn
+
+
+def _a_texto(valor):
+    # SQLite guarda las fechas como texto ISO (solo la fecha, como las columnas DATE de SQL Server)
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+def insertar_filas_sqlite(conn, filas):
+    """
+    Inserta filas ya preparadas en una única transacción y las suma al resumen de gastos.
+
+    Args:
+        conn (sqlite3.Connection): Conexión a la base local.
+        filas (list): Tuplas (orden, archivo, entidad_id, cliente, monto, vencimiento, periodo,
+            condicion_iva, codigo_barra, cuil), como las arma main.preparar_filas.
+
+    Returns:
+        set: Códigos de barras insertados (los que ya existían no se incluyen).
+    """
+    insertados = set()
+    with conn:
+        for fila in filas:
+            params = tuple(_a_texto(valor) for valor in fila[1:])
+            if not conn.execute(SQL_INSERTAR_FACTURA, params).rowcount:
+                continue
+            _, entidad_id, _, monto, vencimiento, periodo, _, codigo, cuil = params
+            insertados.add(codigo)
+            if cuil and periodo:
+                conn.execute(SQL_SUMAR_RESUMEN, (cuil, entidad_id, periodo, monto, vencimiento))
+    return insertados
+
+
+def hay_pendientes(conn):
+    """
+    Indica si hay facturas que todavía no se subieron al servidor.
+    """
+    return conn.execute("SELECT 1 FROM Facturas WHERE sincronizada = 0 LIMIT 1").fetchone() is not None
+
+
+def facturas_pendientes(conn, cantidad=500):
+    """
+    Devuelve las primeras facturas sin sincronizar, con los tipos que espera SQL Server.
+
+    Returns:
+        list: Tuplas (id, archivo, entidad_id, cliente, monto, vencimiento, periodo, condicion_iva,
+            codigo_barra, cuil) con las fechas como `date` y el monto como `Decimal`.
+    """
+    filas = conn.execute("""
+        SELECT id, archivo, entidad_id, cliente, monto, vencimiento, periodo, condicion_iva, codigo_barra, cuil
+        FROM Facturas
+        WHERE sincronizada = 0
+        ORDER BY id
+        LIMIT ?
+    """, (cantidad,)).fetchall()
+    return [
+        (id_factura, archivo, entidad_id, cliente,
+         Decimal(str(monto)) if monto is not None else None,
+         date.fromisoformat(vencimiento[:10]) if vencimiento else None,
+         date.fromisoformat(periodo[:10]) if periodo else None,
+         condicion_iva, codigo, cuil)
+        for id_factura, archivo, entidad_id, cliente, monto, vencimiento, periodo, condicion_iva, codigo, cuil in filas
+    ]
+
+
+def marcar_sincronizadas(conn, ids):
+    """
+    Marca como subidas las facturas indicadas.
+    """
+    with conn:
+        conn.executemany("UPDATE Facturas SET sincronizada = 1 WHERE id = ?", [(i,) for i in ids])
+
+
+def guardar_entidades(conn, entidades):
+    """
+    Reemplaza las entidades locales por las del servidor.
+
+    Args:
+        entidades (list): Tuplas (ID, nombre, cuit, condicion_iva).
+    """
+    with conn:
+        conn.executemany(
+            "INSERT INTO Entidades (ID, nombre, cuit, condicion_iva) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (ID) DO UPDATE SET nombre = excluded.nombre, cuit = excluded.cuit, "
+            "condicion_iva = excluded.condicion_iva",
+            [tuple(entidad) for entidad in entidades]
+        )
@@ -1,26 +1,69 @@
-from pyzbar.pyzbar import decode
-from PIL import Image
-import numpy as np
+from pyzbar.pyzbar import decode, ZBarSymbol
 import cv2
+from utils.plantillas import recortar_region
+from utils.metricas import cronometrado
 
+# Simbologías de los códigos de pago que leen los parsers (Interleaved 2 of 5 y Code 128). Con todas
+# habilitadas, zbar prueba cada una sobre cada línea de la imagen y además devuelve QR y EAN que
+# ningún parser usa
+SIMBOLOGIAS = [ZBarSymbol.I25, ZBarSymbol.CODE128]
 
+# Franja inferior de la página (en fracciones, como las regiones de utils/plantillas.py),
+# donde las facturas imprimen el código de pago
+BANDA_CODIGO = (0.0, 0.6, 1.0, 1.0)
+
+# Escala de la primera pasada: a 300 DPI las barras más finas miden ~3 píxeles, así que a la mitad
+# siguen siendo legibles y zbar recorre la cuarta parte de los píxeles
+ESCALA_REDUCIDA = 0.5
+
+# Longitud mínima de un código de pago (Movistar usa 30 dígitos; Edesur y Metrogas, más de 40)
+LONGITUD_MINIMA_CODIGO = 30
+
+# Intentos en orden: (región de la página, escala). Se corta en el primero que encuentra un código de pago
+INTENTOS = (
+    (BANDA_CODIGO, ESCALA_REDUCIDA),
+    (BANDA_CODIGO, 1.0),
+    (None, 1.0),
+)
+
+
+def es_codigo_de_pago(codigo):
+    """
+    Indica si el código tiene la forma de los códigos de pago que consumen los parsers.
+    """
+    return codigo.isdigit() and len(codigo) >= LONGITUD_MINIMA_CODIGO
+
+
+def _decodificar(gris, region, escala):
+    imagen = recortar_region(gris, region) if region else gris
+    if escala != 1.0:
+        imagen = cv2.resize(imagen, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    return [d.data.decode('utf-8') for d in decode(imagen, symbols=SIMBOLOGIAS)]
+
+
+@cronometrado('codigos_barras')
 def extraer_codigos_barras(imagen_cv):
     """
-    Extrae códigos de barras y QR desde una imagen OpenCV.
+    Extrae los códigos de barras de pago desde una imagen OpenCV.
+
+    Primero se busca en la franja inferior de la página reducida a la mitad, después en la franja
+    a resolución completa y, si en ninguna aparece un código de pago, en la página completa.
 
     Args:
-        imagen_cv (np.ndarray): Imagen en formato OpenCV (BGR).
+        imagen_cv (np.ndarray): Imagen en escala de grises (un canal de 8 bits) o BGR.
 
     Returns:
         list: Lista de textos decodificados desde los códigos.
     """
-    # Convertir imagen de OpenCV a PIL
-    imagen_pil = Image.fromarray(cv2.cvtColor(imagen_cv, cv2.COLOR_BGR2RGB))
-
-    # Decodificar códigos
-    decodificados = decode(imagen_pil)
+    # pyzbar trabaja sobre un único canal de 8 bits: la imagen en escala de grises se le pasa tal cual,
+    # sin convertirla a PIL. Solo las imágenes en color se pasan a grises antes
+    if imagen_cv.ndim == 3:
+        imagen_cv = cv2.cvtColor(imagen_cv, cv2.COLOR_BGR2GRAY)
 
-    # Obtener los datos en texto
-    codigos = [d.data.decode('utf-8') for d in decodificados]
+    codigos = []
+    for region, escala in INTENTOS:
+        codigos = _decodificar(imagen_cv, region, escala)
+        if any(es_codigo_de_pago(codigo) for codigo in codigos):
+            break
 
     return codigos
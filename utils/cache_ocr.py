@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+
+
+class CacheOCR:
+    """
+    Cache en disco del texto OCR y de los códigos de barras de cada PDF.
+
+    Las entradas se guardan como archivos JSON cuyo nombre es el SHA-256 del
+    contenido del PDF combinado con la configuración usada (DPI, idioma, etc.),
+    así que un mismo archivo subido con otro nombre reutiliza el resultado.
+    Cuando el tamaño total supera el límite se borran las entradas usadas hace
+    más tiempo (LRU, usando la fecha de modificación del archivo).
+    """
+
+    def __init__(self, carpeta='.cache_ocr', tamano_maximo=200 * 1024 * 1024):
+        """
+        Args:
+            carpeta (str): Carpeta donde se guardan las entradas.
+            tamano_maximo (int): Tamaño máximo de la cache en bytes.
+        """
+        self.carpeta = carpeta
+        self.tamano_maximo = tamano_maximo
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        os.makedirs(carpeta, exist_ok=True)
+        self._tamano_actual = sum(tamano for _, _, tamano in self._listar_entradas())
+
+    def clave(self, contenido_pdf, **configuracion):
+        """
+        Calcula la clave de una entrada.
+
+        Args:
+            contenido_pdf (bytes): Contenido completo del PDF.
+            **configuracion: Parámetros que cambian el resultado (dpi, idioma, ...).
+
+        Returns:
+            str: Clave hexadecimal.
+        """
+        h = hashlib.sha256(contenido_pdf)
+        h.update(json.dumps(configuracion, sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def obtener(self, clave):
+        """
+        Devuelve la entrada guardada para la clave, o None si no existe.
+
+        Args:
+            clave (str): Clave calculada con `clave`.
+
+        Returns:
+            dict | None: Diccionario con 'texto' y 'codigos'.
+        """
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                entrada = json.load(f)
+            # Actualizamos la fecha de modificación para que cuente como uso reciente
+            os.utime(ruta, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self.fallos += 1
+            return None
+        with self._lock:
+            self.aciertos += 1
+        return entrada
+
+    def guardar(self, clave, entrada):
+        """
+        Guarda (o reemplaza) una entrada y desaloja las más viejas si hace falta.
+
+        Args:
+            clave (str): Clave calculada con `clave`.
+            entrada (dict): Diccionario serializable a JSON.
+        """
+        ruta = self._ruta(clave)
+        contenido = json.dumps(entrada, ensure_ascii=False).encode('utf-8')
+        anterior = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+
+        # Escritura atómica: otro proceso nunca ve un JSON a medio escribir
+        temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+
+        with self._lock:
+            self._tamano_actual += len(contenido) - anterior
+            if self._tamano_actual > self.tamano_maximo:
+                self._desalojar()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Aciertos, fallos, desalojos y tamaño actual en bytes.
+        """
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'tamano': self._tamano_actual,
+            }
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, f'{clave}.json')
+
+    def _listar_entradas(self):
+        entradas = []
+        with os.scandir(self.carpeta) as it:
+            for e in it:
+                if e.name.endswith('.json'):
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    entradas.append((e.path, st.st_mtime, st.st_size))
+        return entradas
+
+    def _desalojar(self):
+        # Recalculamos desde el disco porque otros procesos pueden haber escrito entradas
+        entradas = sorted(self._listar_entradas(), key=lambda e: e[1])
+        self._tamano_actual = sum(tamano for _, _, tamano in entradas)
+        # Dejamos un margen para no desalojar en cada escritura
+        objetivo = self.tamano_maximo * 0.9
+        for ruta, _, tamano in entradas:
+            if self._tamano_actual <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            self._tamano_actual -= tamano
+            self.desalojos += 1
+
+
+_cache = None
+
+
+def obtener_cache():
+    """
+    Devuelve la cache compartida del proceso, o None si está desactivada.
+
+    Se configura con las variables de entorno FACTURAI_CACHE (0 para desactivar),
+    FACTURAI_CACHE_DIR y FACTURAI_CACHE_MB.
+
+    Returns:
+        CacheOCR | None: Cache del proceso.
+    """
+    global _cache
+    if os.environ.get('FACTURAI_CACHE', '1') == '0':
+        return None
+    if _cache is None:
+        _cache = CacheOCR(
+            carpeta=os.environ.get('FACTURAI_CACHE_DIR', '.cache_ocr'),
+            tamano_maximo=int(os.environ.get('FACTURAI_CACHE_MB', '200')) * 1024 * 1024,
+        )
+    return _cache
@@ -0,0 +1,147 @@
+from datetime import datetime, date
+import cv2
+from utils.ocr import aplicar_ocr
+from utils.plantillas import recortar_region
+
+# Clasificación del proveedor de una factura antes de aplicar OCR. Se usan primero las señales más
+# baratas: la estructura del código de barras, el texto que ya se tenga (capa de texto del PDF),
+# una miniatura del encabezado y, como último recurso, el nombre del archivo.
+
+# Palabras que identifican a cada proveedor en el texto de la factura o en el nombre del archivo
+PALABRAS_CLAVE = {
+    'edesur': ('edesur',),
+    'metrogas': ('metrogas',),
+    'movistar': ('movistar', 'telefonica', 'telefónica'),
+}
+
+# Franja superior de la página donde está el nombre del proveedor (en fracciones, como las plantillas)
+REGION_ENCABEZADO = (0.0, 0.0, 1.0, 0.15)
+
+# Ancho en píxeles de la miniatura del encabezado (unos 100 DPI para una hoja A4)
+ANCHO_MINIATURA = 800
+
+# Años aceptados en las fechas de vencimiento embebidas en los códigos de barras
+ANIO_MINIMO = 2000
+MARGEN_ANIOS = 2
+
+
+def _fecha_valida(texto, formato):
+    """
+    Indica si el texto es una fecha válida con un año razonable para un vencimiento.
+    """
+    try:
+        anio = datetime.strptime(texto, formato).year
+    except ValueError:
+        return False
+    return ANIO_MINIMO <= anio <= date.today().year + MARGEN_ANIOS
+
+
+def _candidatos_codigo(codigo):
+    """
+    Devuelve los proveedores cuya estructura de código de barras coincide con el código.
+    Las posiciones son las mismas que usan los parsers de cada proveedor.
+    """
+    candidatos = set()
+    if not codigo.isdigit():
+        return candidatos
+    # Movistar: al menos 30 dígitos con el vencimiento DDMMAAAA en las posiciones 20 a 28
+    if len(codigo) >= 30 and _fecha_valida(codigo[20:28], "%d%m%Y"):
+        candidatos.add('movistar')
+    if len(codigo) > 40:
+        # Edesur: más de 40 dígitos con el vencimiento AAMMDD en las posiciones 24 a 30
+        if _fecha_valida(codigo[24:30], "%y%m%d"):
+            candidatos.add('edesur')
+        # Metrogas: más de 40 dígitos sin vencimiento, con monto (20 a 28) y número de cliente (33 a 44)
+        elif len(codigo) >= 44 and int(codigo[20:28]) and int(codigo[33:44]):
+            candidatos.add('metrogas')
+    return candidatos
+
+
+def clasificar_por_codigo(codigos_barras):
+    """
+    Clasifica la factura según la estructura de sus códigos de barras.
+
+    Args:
+        codigos_barras (list): Códigos decodificados de la página.
+
+    Returns:
+        str | None: Proveedor, o None si no hay códigos o la estructura es ambigua.
+    """
+    for codigo in codigos_barras:
+        candidatos = _candidatos_codigo(codigo)
+        if len(candidatos) == 1:
+            return candidatos.pop()
+    return None
+
+
+def clasificar_por_texto(texto):
+    """
+    Clasifica la factura según el proveedor que más se menciona en el texto.
+
+    Returns:
+        str | None: Proveedor, o None si no se menciona ninguno o hay empate.
+    """
+    if not texto:
+        return None
+    texto = texto.lower()
+    menciones = {
+        entidad: sum(texto.count(palabra) for palabra in palabras)
+        for entidad, palabras in PALABRAS_CLAVE.items()
+    }
+    maximo = max(menciones.values())
+    elegidos = [entidad for entidad, cantidad in menciones.items() if cantidad == maximo]
+    return elegidos[0] if maximo and len(elegidos) == 1 else None
+
+
+def clasificar_por_miniatura(imagen_cv):
+    """
+    Clasifica la factura leyendo con OCR una miniatura en escala de grises del encabezado.
+    Cuesta una fracción del OCR de página completa.
+
+    Args:
+        imagen_cv (np.ndarray): Página en formato OpenCV.
+
+    Returns:
+        str | None: Proveedor, o None si no se reconoce en el encabezado.
+    """
+    encabezado = recortar_region(imagen_cv, REGION_ENCABEZADO)
+    if encabezado.ndim == 3:
+        encabezado = cv2.cvtColor(encabezado, cv2.COLOR_BGR2GRAY)
+    alto, ancho = encabezado.shape[:2]
+    if ancho > ANCHO_MINIATURA:
+        escala = ANCHO_MINIATURA / ancho
+        encabezado = cv2.resize(encabezado, (ANCHO_MINIATURA, max(1, int(alto * escala))),
+                                interpolation=cv2.INTER_AREA)
+    # Texto disperso: el nombre del proveedor puede estar en cualquier parte de la franja
+    return clasificar_por_texto(aplicar_ocr(encabezado, config='--psm 11'))
+
+
+def clasificar_por_nombre(nombre_archivo):
+    """
+    Clasifica la factura según el nombre del archivo.
+
+    Returns:
+        str | None: Proveedor, o None si el nombre no menciona ninguno.
+    """
+    nombre = (nombre_archivo or '').lower()
+    return next((entidad for entidad, palabras in PALABRAS_CLAVE.items()
+                 if any(palabra in nombre for palabra in palabras)), None)
+
+
+def clasificar_factura(codigos_barras=(), imagen_cv=None, texto=None, nombre_archivo=None):
+    """
+    Identifica el proveedor de una factura con las señales disponibles, de la más barata a la más cara.
+
+    Args:
+        codigos_barras (list): Códigos de barras ya decodificados.
+        imagen_cv (np.ndarray | None): Página rasterizada; permite leer la miniatura del encabezado.
+        texto (str | None): Texto ya disponible (capa de texto del PDF o texto en cache).
+        nombre_archivo (str | None): Nombre del archivo, usado solo si no hay otra señal.
+
+    Returns:
+        str | None: Proveedor ('edesur', 'metrogas', 'movistar'), o None si no se pudo clasificar.
+    """
+    entidad = clasificar_por_codigo(codigos_barras) or clasificar_por_texto(texto)
+    if entidad is None and imagen_cv is not None and not texto:
+        entidad = clasificar_por_miniatura(imagen_cv)
+    return entidad or clasificar_por_nombre(nombre_archivo)
@@ -1,3 +1,6 @@
+from utils.referencias import REFERENCIAS
+
+
 def insertar_factura(cursor, datos):
     """
     Inserta una factura en la base de datos si no existe ya una con el mismo código de barras.
@@ -9,28 +12,25 @@ def insertar_factura(cursor, datos):
     Returns:
         bool: True si se insertó, False si ya existía.
     """
-    # Buscar entidad_id
-    cursor.execute("SELECT id FROM Entidades WHERE cuit = %s", (datos['cuit'],))
-    entidad = cursor.fetchone()
+    # Buscar entidad_id en el diccionario de Entidades (la tabla se lee una sola vez por proceso)
+    entidad_id = REFERENCIAS.entidad_por_cuit(datos['cuit'], cursor)
 
-    if not entidad:
+    if entidad_id is None:
         print(f"Entidad con CUIT {datos['cuit']} no encontrada.")
         return False
 
-    entidad_id = entidad[0]
-
-    # Verificar si ya existe la factura por código de barras
-    cursor.execute("SELECT 1 FROM Facturas WHERE codigo_barra = %s", (datos['codigo_barra'],))
-    if cursor.fetchone():
+    # Verificar si ya existe la factura por código de barras en el índice en memoria
+    if REFERENCIAS.existe_codigo(datos['codigo_barra']):
         return False
 
-    # Insertar factura
+    # Insertar factura; la existencia se controla en la misma sentencia, sin una consulta aparte
     cursor.execute("""
         INSERT INTO Facturas (
             archivo, entidad_id, cliente, monto, vencimiento, periodo,
             condicion_iva, codigo_barra, fecha_carga
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, GETDATE())
+        SELECT %s, %s, %s, %s, %s, %s, %s, %s, GETDATE()
+        WHERE NOT EXISTS (SELECT 1 FROM Facturas WITH (UPDLOCK, HOLDLOCK) WHERE codigo_barra = %s)
     """, (
         datos['archivo'],
         entidad_id,
@@ -39,7 +39,13 @@ def insertar_factura(cursor, datos):
         datos.get('vencimiento'),
         datos.get('periodo'),
         datos.get('condicion_iva'),
+        datos.get('codigo_barra'),
         datos.get('codigo_barra')
     ))
 
+    if cursor.rowcount != 1:
+        return False
+
+    # Agregar el código al índice en memoria para que las próximas cargas no vayan a la base
+    REFERENCIAS.agregar_codigos([datos['codigo_barra']])
     return True
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+
+class Manifiesto:
+    """
+    Registro de los PDF ya procesados, para que una nueva corrida sobre la misma carpeta
+    saltee los archivos sin cambios antes de rasterizarlos o aplicarles OCR.
+
+    Por cada archivo se guarda la ruta, el tamaño, la fecha de modificación, el SHA-256 del
+    contenido y el resultado ('cargada', 'duplicada' o 'error'). Un archivo con el mismo tamaño y
+    fecha de modificación no se vuelve a leer; si cambiaron, se compara el hash antes de
+    reprocesarlo. Un archivo con el mismo contenido que otro ya cargado (una copia con otro
+    nombre) también se saltea. Se guarda en SQLite para que la búsqueda por ruta y por hash
+    no dependa de la cantidad de archivos.
+    """
+
+    # Resultados con los que un archivo sin cambios no se vuelve a procesar
+    RESULTADOS_FINALES = ('cargada', 'duplicada')
+
+    def __init__(self, ruta='.manifiesto_facturas.sqlite3'):
+        """
+        Args:
+            ruta (str): Archivo SQLite donde se guarda el manifiesto.
+        """
+        self.ruta = ruta
+        self._conn = sqlite3.connect(ruta)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS archivos (
+                ruta TEXT PRIMARY KEY,
+                tamano INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                resultado TEXT NOT NULL,
+                detalle TEXT,
+                ejecucion INTEGER NOT NULL,
+                fecha TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS IX_archivos_hash ON archivos (hash)")
+        self._conn.commit()
+        # Identifica la corrida actual, para combinar los resultados de las facturas de un mismo PDF
+        self.ejecucion = time.time_ns()
+        # Firma (tamaño, mtime, hash) de los archivos revisados en esta corrida
+        self._firmas = {}
+
+    @staticmethod
+    def calcular_hash(ruta, tamano_bloque=1024 * 1024):
+        h = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(tamano_bloque), b''):
+                h.update(bloque)
+        return h.hexdigest()
+
+    def pendiente(self, ruta, reintentar_errores=False):
+        """
+        Indica si el archivo tiene que procesarse.
+
+        Args:
+            ruta (str): Ruta del PDF.
+            reintentar_errores (bool): Si es True, los archivos que terminaron con error se procesan de nuevo
+                aunque no hayan cambiado.
+
+        Returns:
+            bool: True si el archivo es nuevo, cambió, o no terminó bien (y se pidió reintentar).
+        """
+        estado = os.stat(ruta)
+        tamano, mtime = estado.st_size, estado.st_mtime_ns
+        fila = self._conn.execute(
+            "SELECT tamano, mtime_ns, hash, resultado FROM archivos WHERE ruta = ?", (ruta,)
+        ).fetchone()
+
+        if fila and (fila[0], fila[1]) == (tamano, mtime):
+            # Mismo tamaño y fecha: se da por sin cambios sin leer el contenido
+            hash_contenido = fila[2]
+        else:
+            hash_contenido = self.calcular_hash(ruta)
+            if fila and fila[2] == hash_contenido:
+                # Solo cambió la fecha (por ejemplo, se copió de nuevo): se actualiza la firma
+                self._conn.execute("UPDATE archivos SET tamano = ?, mtime_ns = ? WHERE ruta = ?",
+                                   (tamano, mtime, ruta))
+                self._conn.commit()
+            else:
+                fila = None
+        self._firmas[ruta] = (tamano, mtime, hash_contenido)
+
+        if fila:
+            return fila[3] not in self.RESULTADOS_FINALES and reintentar_errores
+
+        # Archivo nuevo o modificado: si el mismo contenido ya se cargó con otro nombre, no hace falta procesarlo
+        original = self._conn.execute(
+            "SELECT ruta FROM archivos WHERE hash = ? AND resultado IN (?, ?) LIMIT 1",
+            (hash_contenido,) + self.RESULTADOS_FINALES
+        ).fetchone()
+        if original:
+            self.registrar(ruta, 'duplicada', f'Mismo contenido que {original[0]}')
+            return False
+        return True
+
+    def registrar(self, ruta, resultado, detalle=None):
+        """
+        Guarda el resultado de un archivo revisado con `pendiente`.
+
+        Si un PDF trae varias facturas, un error en cualquiera de ellas queda como resultado del archivo
+        para esa corrida.
+        """
+        tamano, mtime, hash_contenido = self._firmas[ruta]
+        self._conn.execute("""
+            INSERT INTO archivos (ruta, tamano, mtime_ns, hash, resultado, detalle, ejecucion, fecha)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'))
+            ON CONFLICT (ruta) DO UPDATE SET
+                tamano = excluded.tamano,
+                mtime_ns = excluded.mtime_ns,
+                hash = excluded.hash,
+                resultado = CASE WHEN archivos.ejecucion = excluded.ejecucion AND archivos.resultado = 'error'
+                                 THEN archivos.resultado ELSE excluded.resultado END,
+                detalle = CASE WHEN archivos.ejecucion = excluded.ejecucion AND archivos.resultado = 'error'
+                               THEN archivos.detalle ELSE excluded.detalle END,
+                ejecucion = excluded.ejecucion,
+                fecha = excluded.fecha
+        """, (ruta, tamano, mtime, hash_contenido, resultado, detalle, self.ejecucion))
+        self._conn.commit()
+
+    def cerrar(self):
+        self._conn.close()
@@ -0,0 +1,212 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites (en segundos) de los buckets de los histogramas: cubren desde el parseo (microsegundos)
+# hasta el OCR de página completa (segundos)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Etiqueta de proveedor para las observaciones que no se pudieron asociar a uno
+ENTIDAD_DESCONOCIDA = 'desconocida'
+
+
+class RegistroMetricas:
+    """
+    Histogramas de duración por etapa del procesamiento, etiquetados por proveedor y resultado.
+
+    Cada serie (etapa, entidad, resultado) guarda la cantidad de observaciones por bucket, la suma
+    y el máximo. Se puede exportar en el formato de texto de Prometheus o como un resumen legible.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        Args:
+            buckets (tuple): Límites superiores de los buckets, en segundos y en orden creciente.
+        """
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, etapa, segundos, entidad=None, resultado='ok'):
+        """
+        Registra la duración de una etapa.
+        """
+        clave = (etapa, entidad or ENTIDAD_DESCONOCIDA, resultado)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = {'buckets': [0] * len(self.buckets), 'suma': 0.0,
+                                               'cantidad': 0, 'maximo': 0.0}
+            indice = bisect.bisect_left(self.buckets, segundos)
+            if indice < len(self.buckets):
+                serie['buckets'][indice] += 1
+            serie['suma'] += segundos
+            serie['cantidad'] += 1
+            serie['maximo'] = max(serie['maximo'], segundos)
+
+    def combinar(self, observaciones):
+        """
+        Registra observaciones hechas en otro proceso (ver `recolectar`).
+
+        Args:
+            observaciones (list): Tuplas (etapa, segundos, entidad, resultado).
+        """
+        for observacion in observaciones:
+            self.observar(*observacion)
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+
+    def _copiar_series(self):
+        with self._lock:
+            return {clave: dict(serie, buckets=list(serie['buckets'])) for clave, serie in self._series.items()}
+
+    def exportar_prometheus(self, nombre='facturai_etapa_segundos'):
+        """
+        Devuelve los histogramas en el formato de texto de Prometheus (versión 0.0.4).
+        """
+        lineas = [
+            f'# HELP {nombre} Duración de cada etapa del procesamiento de facturas.',
+            f'# TYPE {nombre} histogram',
+        ]
+        for (etapa, entidad, resultado), serie in sorted(self._copiar_series().items()):
+            etiquetas = f'etapa="{etapa}",entidad="{entidad}",resultado="{resultado}"'
+            acumulado = 0
+            for limite, cantidad in zip(self.buckets, serie['buckets']):
+                acumulado += cantidad
+                lineas.append(f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {serie["cantidad"]}')
+            lineas.append(f'{nombre}_sum{{{etiquetas}}} {serie["suma"]}')
+            lineas.append(f'{nombre}_count{{{etiquetas}}} {serie["cantidad"]}')
+        return '\n'.join(lineas) + '\n'
+
+    def _percentil(self, serie, p):
+        """
+        Estima un percentil interpolando dentro del bucket que lo contiene.
+        """
+        objetivo = p / 100 * serie['cantidad']
+        acumulado, inferior = 0, 0.0
+        for limite, cantidad in zip(self.buckets, serie['buckets']):
+            if cantidad and acumulado + cantidad >= objetivo:
+                return min(inferior + (limite - inferior) * (objetivo - acumulado) / cantidad, serie['maximo'])
+            acumulado += cantidad
+            inferior = limite
+        return serie['maximo']
+
+    def resumen(self):
+        """
+        Devuelve una tabla con cantidad, media, p50, p95 y máximo (en milisegundos) de cada serie.
+        """
+        lineas = [f"{'etapa':<16}{'entidad':<13}{'resultado':<11}{'cant':>6}{'media':>10}"
+                  f"{'p50':>10}{'p95':>10}{'máx':>10}"]
+        for (etapa, entidad, resultado), serie in sorted(self._copiar_series().items()):
+            media = serie['suma'] / serie['cantidad']
+            lineas.append(
+                f"{etapa:<16}{entidad:<13}{resultado:<11}{serie['cantidad']:>6}{media * 1000:>10.1f}"
+                f"{self._percentil(serie, 50) * 1000:>10.1f}{self._percentil(serie, 95) * 1000:>10.1f}"
+                f"{serie['maximo'] * 1000:>10.1f}"
+            )
+        return '\n'.join(lineas)
+
+
+class Recolector:
+    """
+    Junta observaciones sin registrarlas todavía: para completar el proveedor cuando se conoce
+    (recién después de clasificar la factura) o para devolverlas desde un proceso del pool.
+    """
+
+    def __init__(self):
+        self.observaciones = []
+
+    def observar(self, etapa, segundos, entidad=None, resultado='ok'):
+        self.observaciones.append((etapa, segundos, entidad, resultado))
+
+    def completar_entidad(self, entidad=None):
+        """
+        Asigna el proveedor a las observaciones que no lo tienen. Si no se indica, se usa el primero
+        que aparezca en las observaciones (por ejemplo, el del parser).
+        """
+        entidad = entidad or next((o[2] for o in self.observaciones if o[2]), None)
+        self.observaciones = [(etapa, segundos, e or entidad, resultado)
+                              for etapa, segundos, e, resultado in self.observaciones]
+
+
+# Registro del proceso: lo que exporta /metrics y lo que resume main.py al terminar
+REGISTRO = RegistroMetricas()
+
+# Destino de las observaciones del contexto actual (un Recolector), o None para usar REGISTRO.
+# Los hilos nuevos empiezan sin destino, así que los de la cola de trabajos registran directo.
+_destino = contextvars.ContextVar('destino_metricas', default=None)
+
+
+def observar(etapa, segundos, entidad=None, resultado='ok'):
+    """
+    Registra una observación en el destino del contexto actual.
+    """
+    (_destino.get() or REGISTRO).observar(etapa, segundos, entidad, resultado)
+
+
+@contextmanager
+def recolectar(reenviar=True):
+    """
+    Junta las observaciones hechas dentro del bloque.
+
+    Args:
+        reenviar (bool): Si es True, al salir se pasan al destino anterior (con el proveedor completado).
+            Si es False quedan solo en el recolector, para devolverlas a otro proceso.
+    """
+    recolector = Recolector()
+    token = _destino.set(recolector)
+    try:
+        yield recolector
+    finally:
+        _destino.reset(token)
+        if reenviar:
+            recolector.completar_entidad()
+            destino = _destino.get() or REGISTRO
+            for observacion in recolector.observaciones:
+                destino.observar(*observacion)
+
+
+@contextmanager
+def medir(etapa, entidad=None):
+    """
+    Mide la duración del bloque. Si el bloque levanta una excepción, el resultado es 'error'.
+    """
+    inicio = time.perf_counter()
+    resultado = 'error'
+    try:
+        yield
+        resultado = 'ok'
+    finally:
+        observar(etapa, time.perf_counter() - inicio, entidad, resultado)
+
+
+def cronometrado(etapa, entidad=None):
+    """
+    Decorador que mide cada llamada a la función como una observación de la etapa.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(etapa, entidad):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def exportar_valor(nombre, tipo, ayuda, valor):
+    """
+    Devuelve un valor suelto (gauge o counter) en el formato de texto de Prometheus.
+
+    Args:
+        nombre (str): Nombre de la métrica (los counters terminan en `_total`).
+        tipo (str): 'gauge' o 'counter'.
+        ayuda (str): Descripción para la línea HELP.
+        valor (float): Valor actual.
+    """
+    return f'# HELP {nombre} {ayuda}\n# TYPE {nombre} {tipo}\n{nombre} {valor}\n'
@@ -1,23 +1,164 @@
+import os
+import shlex
+import threading
 import cv2
 import numpy as np
 import pytesseract
+from utils.plantillas import recortar_region
+from utils.preprocesado import preprocesar_para_ocr
+from utils.metricas import cronometrado
 
-def extraer_texto_de_imagen(imagen_pil):
+# tesserocr es opcional: si está instalado se mantiene un motor de Tesseract inicializado por hilo
+# (el modelo de idioma se carga una sola vez) y las imágenes se le pasan en memoria. Si no está,
+# se usa pytesseract, que escribe la imagen a un archivo temporal y lanza un proceso por llamada.
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Idioma con el que se ejecuta Tesseract
+IDIOMA_OCR = 'spa'
+
+# Backend de OCR: 'tesserocr' (motor persistente) o 'pytesseract' (un proceso por llamada)
+BACKEND_OCR = os.environ.get('FACTURAI_OCR_BACKEND', 'tesserocr' if tesserocr else 'pytesseract')
+
+# Motores de tesserocr de cada hilo (un PyTessBaseAPI no se puede usar desde dos hilos a la vez)
+_motores = threading.local()
+
+
+def convertir_a_opencv(imagen_pil):
+    """
+    Convierte una imagen PIL al formato OpenCV.
+
+    Las páginas rasterizadas en escala de grises (modo 'L') se devuelven como un arreglo de un
+    solo canal de 8 bits, sin conversión de color: es el mismo arreglo que después leen Tesseract
+    y el decodificador de códigos de barras. Las imágenes en color se pasan de RGB a BGR.
+
+    Args:
+        imagen_pil (PIL.Image): Imagen en formato PIL.
+
+    Returns:
+        np.ndarray: Imagen en formato OpenCV (escala de grises o BGR).
+    """
+    if imagen_pil.mode == 'L':
+        return np.asarray(imagen_pil)
+    return cv2.cvtColor(np.array(imagen_pil), cv2.COLOR_RGB2BGR)
+
+
+def _parsear_config(config):
+    """
+    Traduce los parámetros de Tesseract al modo de segmentación de tesserocr.
+
+    Returns:
+        int | None: Modo de segmentación (PSM), o None si el config tiene opciones que el motor
+        persistente no soporta y hay que usar pytesseract.
+    """
+    partes = shlex.split(config)
+    psm = tesserocr.PSM.AUTO  # el mismo valor por defecto que la línea de comandos
+    while partes:
+        opcion = partes.pop(0)
+        if opcion != '--psm' or not partes or not partes[0].isdigit():
+            return None
+        psm = int(partes.pop(0))
+    return psm
+
+
+def _obtener_motor():
+    """
+    Devuelve el motor de tesserocr del hilo actual, creándolo la primera vez.
+
+    Returns:
+        tesserocr.PyTessBaseAPI | None: Motor inicializado, o None si no se pudo inicializar
+        (por ejemplo, si falta el archivo de idioma), en cuyo caso se usa pytesseract.
+    """
+    if not hasattr(_motores, 'motor'):
+        try:
+            _motores.motor = tesserocr.PyTessBaseAPI(lang=IDIOMA_OCR)
+        except RuntimeError:
+            _motores.motor = None
+    return _motores.motor
+
+
+def _ocr_persistente(imagen_cv, psm):
+    """
+    Aplica OCR con el motor persistente del hilo, pasándole los píxeles en memoria.
+
+    Returns:
+        str | None: Texto reconocido, o None si no hay motor disponible.
+    """
+    motor = _obtener_motor()
+    if motor is None:
+        return None
+    imagen = np.ascontiguousarray(imagen_cv)
+    alto, ancho = imagen.shape[:2]
+    canales = 1 if imagen.ndim == 2 else imagen.shape[2]
+    motor.SetPageSegMode(psm)
+    # Mismos bytes que recibe pytesseract (que tampoco reordena los canales de un array de numpy)
+    motor.SetImageBytes(imagen.tobytes(), ancho, alto, canales, ancho * canales)
+    return motor.GetUTF8Text()
+
+
+@cronometrado('ocr')
+def aplicar_ocr(imagen_cv, config=''):
+    """
+    Aplica Tesseract OCR sobre una imagen ya convertida a OpenCV.
+
+    Usa el motor persistente del hilo si está disponible y, si no, pytesseract.
+
+    Args:
+        imagen_cv (np.ndarray): Imagen en formato OpenCV (BGR o escala de grises).
+        config (str): Parámetros extra para Tesseract (por ejemplo '--psm 6').
+
+    Returns:
+        str: Texto reconocido.
+    """
+    if BACKEND_OCR == 'tesserocr' and tesserocr is not None:
+        psm = _parsear_config(config)
+        if psm is not None:
+            texto = _ocr_persistente(imagen_cv, psm)
+            if texto is not None:
+                return texto
+    return pytesseract.image_to_string(imagen_cv, lang=IDIOMA_OCR, config=config)
+
+
+def aplicar_ocr_por_regiones(imagen_cv, plantilla, config='--psm 6'):
+    """
+    Aplica OCR solo sobre las regiones de una plantilla de proveedor.
+
+    Args:
+        imagen_cv (np.ndarray): Imagen en formato OpenCV (BGR).
+        plantilla (list): Regiones definidas en utils/plantillas.py.
+        config (str): Parámetros de Tesseract para las regiones del proveedor.
+
+    Returns:
+        str: Texto de todas las regiones, una a continuación de la otra.
+    """
+    textos = []
+    for region in plantilla:
+        recorte = recortar_region(imagen_cv, region['region'])
+        # Cada región es un bloque de texto uniforme, así que por defecto se lee como tal
+        textos.append(aplicar_ocr(recorte, config=config))
+    return '\n'.join(textos)
+
+
+def extraer_texto_de_imagen(imagen_pil, preprocesado=None, dpi=300):
     """
     Extrae texto de una imagen usando Tesseract OCR.
 
     Args:
         imagen_pil (PIL.Image): Imagen en formato PIL.
+        preprocesado (dict | None): Opciones de utils/preprocesado.py para la imagen que recibe Tesseract.
+        dpi (int): Resolución con la que se rasterizó la imagen.
 
     Returns:
         tuple:
             - texto extraído (str)
-            - imagen en formato OpenCV (np.ndarray)
+            - imagen en formato OpenCV (np.ndarray), sin preprocesar
     """
     # Convertir imagen de PIL a OpenCV
-    imagen_cv = cv2.cvtColor(np.array(imagen_pil), cv2.COLOR_RGB2BGR)
+    imagen_cv = convertir_a_opencv(imagen_pil)
     
     # Aplicar OCR con Tesseract
-    texto = pytesseract.image_to_string(imagen_cv, lang='spa')
+    texto = aplicar_ocr(preprocesar_para_ocr(imagen_cv, preprocesado, dpi))
 
     return texto, imagen_cv
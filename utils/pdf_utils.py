@@ -1,15 +1,159 @@
-from pdf2image import convert_from_path
+import os
+import re
+import subprocess
+from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes, pdfinfo_from_path
+from utils.metricas import cronometrado
 
-def convertir_pdf_a_imagen(pdf_path, dpi=300):
+# Resolución usada para rasterizar las facturas
+DPI_POR_DEFECTO = 300
+
+# Las páginas se rasterizan directamente en escala de grises (un byte por píxel): el OCR y los códigos
+# de barras no usan el color, y una página A4 a 300 DPI ocupa ~8,7 MB en lugar de ~26 MB
+ESCALA_DE_GRISES = True
+
+# Mínimo de caracteres alfanuméricos para considerar que la capa de texto es utilizable
+MINIMO_CARACTERES_TEXTO = 200
+
+# Secuencias largas de dígitos (permitiendo espacios entre grupos) como las que se imprimen debajo del código de barras
+_PATRON_CODIGO_IMPRESO = re.compile(r'\d(?:[ \t]?\d){29,}')
+
+class PDFEnMemoria:
+    """
+    PDF recibido como bytes (por ejemplo, un archivo subido a la aplicación web), para procesarlo
+    sin guardarlo en disco. Las funciones de este módulo y de main.py aceptan un PDFEnMemoria en
+    cualquier lugar donde reciben la ruta de un PDF.
+    """
+
+    # Los PDF empiezan con esta firma (puede haber algunos bytes antes, pero pocos)
+    FIRMA = b'%PDF-'
+
+    def __init__(self, contenido, nombre):
+        """
+        Args:
+            contenido (bytes): Contenido del PDF.
+            nombre (str): Nombre del archivo, para mostrarlo y para clasificar por nombre.
+        """
+        self.contenido = bytes(contenido)
+        self.nombre = nombre
+
+    @classmethod
+    def desde_stream(cls, stream, nombre):
+        """
+        Lee el PDF desde un objeto tipo archivo (por ejemplo, el stream de un archivo subido).
+        """
+        return cls(stream.read(), nombre)
+
+    def es_pdf(self):
+        return self.FIRMA in self.contenido[:1024]
+
+    def __str__(self):
+        return self.nombre
+
+    def __repr__(self):
+        return f'PDFEnMemoria({self.nombre!r}, {len(self.contenido)} bytes)'
+
+
+def nombre_pdf(pdf):
+    """
+    Devuelve el nombre del archivo de un PDF en disco o en memoria.
     """
-    Convierte la primera página de un PDF en una imagen PIL.
+    return pdf.nombre if isinstance(pdf, PDFEnMemoria) else os.path.basename(pdf)
+
+
+def leer_pdf(pdf):
+    """
+    Devuelve el contenido de un PDF en disco o en memoria.
+    """
+    if isinstance(pdf, PDFEnMemoria):
+        return pdf.contenido
+    with open(pdf, 'rb') as f:
+        return f.read()
+
+
+@cronometrado('rasterizado')
+def convertir_pdf_a_imagen(pdf_path, dpi=DPI_POR_DEFECTO, pagina=1, grises=ESCALA_DE_GRISES):
+    """
+    Convierte una página de un PDF en una imagen PIL.
+
+    Solo se rasteriza la página pedida: en un PDF de muchas páginas las demás no se
+    convierten ni se cargan en memoria.
 
     Args:
-        pdf_path (str): Ruta al archivo PDF.
+        pdf_path (str | PDFEnMemoria): Ruta al archivo PDF, o el PDF en memoria.
         dpi (int): Resolución para la conversión. Por defecto: 300.
+        pagina (int): Número de página (empezando en 1). Por defecto: la primera.
+        grises (bool): Si es True, la página se rasteriza en escala de grises (modo 'L').
+
+    Returns:
+        PIL.Image: Imagen de la página.
+    """
+    if isinstance(pdf_path, PDFEnMemoria):
+        paginas = convert_from_bytes(pdf_path.contenido, dpi=dpi, first_page=pagina, last_page=pagina,
+                                     grayscale=grises)
+    else:
+        paginas = convert_from_path(pdf_path, dpi=dpi, first_page=pagina, last_page=pagina, grayscale=grises)
+    return paginas[0]
+
+def contar_paginas(pdf_path):
+    """
+    Devuelve la cantidad de páginas de un PDF sin rasterizarlo (usa `pdfinfo` de poppler).
+
+    Args:
+        pdf_path (str | PDFEnMemoria): Ruta al archivo PDF, o el PDF en memoria.
+
+    Returns:
+        int: Cantidad de páginas.
+    """
+    if isinstance(pdf_path, PDFEnMemoria):
+        return int(pdfinfo_from_bytes(pdf_path.contenido)['Pages'])
+    return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+@cronometrado('texto_embebido')
+def extraer_texto_embebido(pdf_path, pagina=1):
+    """
+    Extrae la capa de texto de una página de un PDF generado digitalmente.
+
+    Usa `pdftotext`, que viene con poppler (la misma dependencia que usa pdf2image). Un PDF en
+    memoria se le pasa por la entrada estándar.
+
+    Args:
+        pdf_path (str | PDFEnMemoria): Ruta al archivo PDF, o el PDF en memoria.
+        pagina (int): Número de página (empezando en 1). Por defecto: la primera.
+
+    Returns:
+        str: Texto embebido, o cadena vacía si no hay capa de texto o no se pudo leer.
+    """
+    en_memoria = isinstance(pdf_path, PDFEnMemoria)
+    try:
+        resultado = subprocess.run(
+            ['pdftotext', '-enc', 'UTF-8', '-f', str(pagina), '-l', str(pagina),
+             '-' if en_memoria else pdf_path, '-'],
+            input=pdf_path.contenido if en_memoria else None, capture_output=True, timeout=30, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    return resultado.stdout.decode('utf-8', errors='replace')
+
+def tiene_capa_de_texto(texto):
+    """
+    Indica si el texto embebido alcanza para parsear la factura sin OCR.
+
+    Args:
+        texto (str): Texto devuelto por `extraer_texto_embebido`.
+
+    Returns:
+        bool: True si la capa de texto es utilizable.
+    """
+    return sum(1 for c in texto if c.isalnum()) >= MINIMO_CARACTERES_TEXTO
+
+def buscar_codigos_en_texto(texto):
+    """
+    Busca en el texto los números de código de barras impresos en la factura.
+
+    Args:
+        texto (str): Texto de la factura.
 
     Returns:
-        PIL.Image: Imagen de la primera página del PDF.
+        list: Códigos encontrados, solo dígitos.
     """
-    paginas = convert_from_path(pdf_path, dpi=dpi)
-    return paginas[0]  # Retornamos solo la primera página
+    return [re.sub(r'\s', '', m.group(0)) for m in _PATRON_CODIGO_IMPRESO.finditer(texto)]
@@ -0,0 +1,83 @@
+# Plantillas de diseño por proveedor: regiones de la página (en fracciones del ancho y alto,
+# para que no dependan del DPI) donde se imprimen los campos que necesitan los parsers.
+# El proveedor lo decide utils/clasificador.py antes del OCR, a partir del contenido de la factura.
+# 'campos' son los datos que se leen de cada región: las regiones cuyos campos ya completó el código de
+# barras no se leen (ver main.leer_texto). Si algún campo queda vacío después de leer las regiones,
+# se vuelve al OCR de página completa.
+
+# Cambiar este número cada vez que se modifiquen las regiones o los parámetros de OCR, así la cache de OCR no reutiliza textos viejos
+VERSION_PLANTILLAS = 3
+
+PLANTILLAS = {
+    'edesur': [
+        # Datos del cliente, condición frente al IVA y período
+        {'nombre': 'encabezado', 'region': (0.0, 0.0, 1.0, 0.28), 'campos': ('cliente', 'condicion_iva', 'periodo')},
+        # Recuadro de vencimientos y total a pagar
+        {'nombre': 'totales', 'region': (0.0, 0.28, 1.0, 0.60), 'campos': ('vencimiento', 'monto')},
+    ],
+    'metrogas': [
+        {'nombre': 'encabezado', 'region': (0.0, 0.0, 1.0, 0.30), 'campos': ('cliente', 'condicion_iva', 'periodo')},
+        {'nombre': 'totales', 'region': (0.40, 0.30, 1.0, 0.65), 'campos': ('vencimiento', 'monto')},
+    ],
+    'movistar': [
+        {'nombre': 'encabezado', 'region': (0.0, 0.0, 1.0, 0.25), 'campos': ('cliente', 'condicion_iva')},
+        {'nombre': 'totales', 'region': (0.0, 0.25, 1.0, 0.55), 'campos': ('vencimiento', 'monto')},
+    ],
+}
+
+# Parámetros de Tesseract por proveedor: 'pagina' para el OCR de página completa, 'regiones' para
+# las regiones de la plantilla y 'preprocesado' para la imagen que recibe Tesseract (ver
+# utils/preprocesado.py): 'dpi' es la resolución a la que se reduce la página (None para no reducirla),
+# 'enderezar' corrige la inclinación de los escaneos y 'binarizar' aplica un umbral adaptativo.
+# El preprocesado queda desactivado (None: Tesseract recibe la página tal como se rasterizó) hasta
+# calibrarlo: los valores hay que elegirlos corriendo benchmarks/calibrar_preprocesado.py con
+# --carpeta sobre una muestra real de cada proveedor, no sobre las facturas sintéticas.
+# Los proveedores sin entrada (o sin clasificar) usan CONFIG_OCR_POR_DEFECTO.
+CONFIG_OCR_POR_DEFECTO = {'pagina': '', 'regiones': '--psm 6', 'preprocesado': None}
+CONFIG_OCR = {
+    'edesur': {'pagina': '', 'regiones': '--psm 6', 'preprocesado': None},
+    'metrogas': {'pagina': '', 'regiones': '--psm 6', 'preprocesado': None},
+    'movistar': {'pagina': '', 'regiones': '--psm 6', 'preprocesado': None},
+}
+
+
+def obtener_plantilla(entidad):
+    """
+    Devuelve las regiones definidas para un proveedor.
+
+    Args:
+        entidad (str): Nombre del proveedor ('edesur', 'metrogas', 'movistar').
+
+    Returns:
+        list | None: Lista de regiones, o None si el proveedor no tiene plantilla.
+    """
+    return PLANTILLAS.get(entidad)
+
+
+def obtener_config_ocr(entidad):
+    """
+    Devuelve los parámetros de Tesseract para un proveedor.
+
+    Args:
+        entidad (str | None): Nombre del proveedor, o None si no se pudo clasificar.
+
+    Returns:
+        dict: {'pagina': str, 'regiones': str, 'preprocesado': dict | None}
+    """
+    return CONFIG_OCR.get(entidad, CONFIG_OCR_POR_DEFECTO)
+
+
+def recortar_region(imagen_cv, region):
+    """
+    Recorta una región de la imagen sin copiar los píxeles (vista de numpy).
+
+    Args:
+        imagen_cv (np.ndarray): Imagen en formato OpenCV.
+        region (tuple): (x0, y0, x1, y1) en fracciones de la página.
+
+    Returns:
+        np.ndarray: Vista de la región recortada.
+    """
+    alto, ancho = imagen_cv.shape[:2]
+    x0, y0, x1, y1 = region
+    return imagen_cv[int(y0 * alto):int(y1 * alto), int(x0 * ancho):int(x1 * ancho)]
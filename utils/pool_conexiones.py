@@ -0,0 +1,180 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolConexiones:
+    """
+    Pool acotado de conexiones a la base de datos, compartido entre los hilos del servidor.
+
+    Las conexiones se reutilizan en lugar de abrir una nueva (TCP + autenticación)
+    en cada request. Al entregarlas se verifica que sigan vivas y al devolverlas
+    se descarta cualquier transacción pendiente.
+    """
+
+    def __init__(self, crear_conexion, tamano=5, timeout=10, consulta_chequeo='SELECT 1'):
+        """
+        Args:
+            crear_conexion (callable): Función que abre una conexión nueva.
+            tamano (int): Máximo de conexiones abiertas a la vez.
+            timeout (float): Segundos máximos de espera para obtener una conexión.
+            consulta_chequeo (str): Consulta liviana para verificar la conexión.
+        """
+        self._crear_conexion = crear_conexion
+        self.tamano = tamano
+        self.timeout = timeout
+        self._consulta_chequeo = consulta_chequeo
+        # Conexiones libres (se reutiliza la última devuelta). La condición protege también los contadores
+        # y avisa a quienes esperan cuando se devuelve o se descarta una conexión
+        self._libres = []
+        self._condicion = threading.Condition()
+        self._abiertas = 0
+        self._en_uso = 0
+        self._esperas = 0
+        self._creaciones = 0
+        self._descartes = 0
+        self._tiempo_espera = 0.0
+
+    @contextmanager
+    def conexion(self):
+        """
+        Presta una conexión del pool y la devuelve al salir del bloque `with`.
+
+        Raises:
+            TimeoutError: Si no se consigue una conexión dentro del timeout.
+        """
+        conn = self.obtener()
+        sana = True
+        try:
+            yield conn
+        except Exception:
+            sana = self._esta_sana(conn)
+            raise
+        finally:
+            self.devolver(conn, sana)
+
+    def obtener(self):
+        """
+        Presta una conexión del pool. Quien la pide tiene que devolverla con `devolver`
+        (para los casos en que el uso no cabe en un bloque `with`, como una respuesta en streaming).
+
+        Returns:
+            Conexión verificada.
+
+        Raises:
+            TimeoutError: Si no se consigue una conexión dentro del timeout.
+        """
+        return self._adquirir()
+
+    def devolver(self, conn, sana=True):
+        """
+        Devuelve una conexión prestada por `obtener`.
+
+        Args:
+            conn: Conexión prestada.
+            sana (bool): Si es False, la conexión se cierra en lugar de volver al pool.
+        """
+        self._liberar(conn, sana)
+
+    def metricas(self):
+        """
+        Returns:
+            dict: Conexiones en uso, libres, abiertas, esperas, creaciones, descartes
+                y segundos totales esperando una conexión.
+        """
+        with self._condicion:
+            return {
+                'tamano': self.tamano,
+                'en_uso': self._en_uso,
+                'libres': len(self._libres),
+                'abiertas': self._abiertas,
+                'esperas': self._esperas,
+                'creaciones': self._creaciones,
+                'descartes': self._descartes,
+                'segundos_esperando': round(self._tiempo_espera, 3),
+            }
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres."""
+        with self._condicion:
+            libres, self._libres = self._libres, []
+        for conn in libres:
+            self._descartar(conn)
+
+    def _adquirir(self):
+        limite = time.monotonic() + self.timeout
+        espero = False
+        while True:
+            with self._condicion:
+                # Pool lleno: esperamos a que alguien devuelva una conexión o descarte una (lo que libera
+                # un lugar para crear otra). Cada aviso vuelve a revisar las dos condiciones
+                while not self._libres and self._abiertas >= self.tamano:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise TimeoutError(f'No hay conexiones libres después de {self.timeout} s')
+                    if not espero:
+                        espero = True
+                        self._esperas += 1
+                    inicio = time.monotonic()
+                    self._condicion.wait(restante)
+                    self._tiempo_espera += time.monotonic() - inicio
+
+                # Primero intentamos reutilizar una conexión libre
+                conn = self._libres.pop() if self._libres else None
+                if conn is None:
+                    self._abiertas += 1
+
+            if conn is None:
+                try:
+                    conn = self._crear_conexion()
+                except Exception:
+                    with self._condicion:
+                        self._abiertas -= 1
+                        self._condicion.notify()
+                    raise
+                with self._condicion:
+                    self._creaciones += 1
+            elif not self._esta_sana(conn):
+                # Conexión reutilizada pero cortada (por ejemplo, por un reinicio del servidor)
+                self._descartar(conn)
+                continue
+
+            with self._condicion:
+                self._en_uso += 1
+            return conn
+
+    def _liberar(self, conn, sana):
+        with self._condicion:
+            self._en_uso -= 1
+        if sana:
+            try:
+                conn.rollback()
+            except Exception:
+                sana = False
+        if sana:
+            with self._condicion:
+                self._libres.append(conn)
+                self._condicion.notify()
+        else:
+            self._descartar(conn)
+
+    def _esta_sana(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self._consulta_chequeo)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._condicion:
+            self._abiertas -= 1
+            self._descartes += 1
+            # Se liberó un lugar: alguien que espera puede crear una conexión nueva
+            self._condicion.notify()
@@ -0,0 +1,144 @@
+import cv2
+import numpy as np
+from utils.metricas import cronometrado
+
+# Preprocesado de la página antes del OCR: escala de grises, reducción de resolución, enderezado
+# y binarización adaptativa. Tesseract binariza internamente con Otsu sobre la imagen completa,
+# que a 300 DPI es lo más caro de la llamada; si recibe una imagen ya binarizada y más chica, ese
+# paso es trivial y el reconocimiento trabaja sobre menos píxeles. Los códigos de barras se siguen
+# leyendo de la imagen original: este preprocesado solo se usa para el OCR.
+
+# Ancho (en píxeles) de la miniatura sobre la que se estima la inclinación
+ANCHO_ESTIMACION = 1000
+
+# Inclinaciones (en grados) que se prueban al enderezar y paso de la búsqueda
+INCLINACION_MAXIMA = 5.0
+PASO_INCLINACION = 0.25
+
+# Por debajo de este ángulo no se rota (la rotación cuesta más que lo que mejora el OCR)
+INCLINACION_MINIMA = 0.3
+
+
+def a_escala_de_grises(imagen_cv):
+    """
+    Devuelve la imagen con un solo canal (sin copiarla si ya está en escala de grises).
+    """
+    if imagen_cv.ndim == 2:
+        return imagen_cv
+    return cv2.cvtColor(imagen_cv, cv2.COLOR_BGR2GRAY)
+
+
+def reducir_resolucion(imagen_cv, dpi_origen, dpi_destino):
+    """
+    Reduce la imagen de `dpi_origen` a `dpi_destino` (no la agranda nunca).
+
+    Args:
+        imagen_cv (np.ndarray): Imagen en formato OpenCV.
+        dpi_origen (int): Resolución con la que se rasterizó la página.
+        dpi_destino (int | None): Resolución buscada, o None para no cambiarla.
+
+    Returns:
+        np.ndarray: Imagen reducida (o la misma si no hace falta reducirla).
+    """
+    if not dpi_destino or dpi_destino >= dpi_origen:
+        return imagen_cv
+    escala = dpi_destino / dpi_origen
+    alto, ancho = imagen_cv.shape[:2]
+    return cv2.resize(imagen_cv, (max(1, round(ancho * escala)), max(1, round(alto * escala))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _rotar(imagen_cv, angulo, interpolacion=cv2.INTER_LINEAR):
+    alto, ancho = imagen_cv.shape[:2]
+    matriz = cv2.getRotationMatrix2D((ancho / 2, alto / 2), angulo, 1.0)
+    return cv2.warpAffine(imagen_cv, matriz, (ancho, alto), flags=interpolacion,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def estimar_inclinacion(gris):
+    """
+    Estima la inclinación de las líneas de texto por perfil de proyección: se prueban rotaciones
+    de la miniatura y se elige la que deja las filas más contrastadas (líneas de texto negras
+    separadas por interlineados blancos).
+
+    Args:
+        gris (np.ndarray): Página en escala de grises.
+
+    Returns:
+        float: Ángulo (en grados) que hay que rotar la página para enderezarla.
+    """
+    alto, ancho = gris.shape[:2]
+    escala = min(1.0, ANCHO_ESTIMACION / ancho)
+    miniatura = cv2.resize(gris, (max(1, round(ancho * escala)), max(1, round(alto * escala))),
+                           interpolation=cv2.INTER_AREA) if escala < 1.0 else gris
+    # Texto en blanco sobre fondo negro, para que las sumas por fila cuenten tinta
+    _, tinta = cv2.threshold(miniatura, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+    mejor_angulo, mejor_puntaje = 0.0, None
+    for angulo in np.arange(-INCLINACION_MAXIMA, INCLINACION_MAXIMA + PASO_INCLINACION / 2, PASO_INCLINACION):
+        matriz = cv2.getRotationMatrix2D((tinta.shape[1] / 2, tinta.shape[0] / 2), float(angulo), 1.0)
+        rotada = cv2.warpAffine(tinta, matriz, (tinta.shape[1], tinta.shape[0]), flags=cv2.INTER_NEAREST)
+        filas = rotada.sum(axis=1, dtype=np.float64)
+        puntaje = float(np.square(np.diff(filas)).sum())
+        if mejor_puntaje is None or puntaje > mejor_puntaje:
+            mejor_angulo, mejor_puntaje = float(angulo), puntaje
+    return mejor_angulo
+
+
+def enderezar(gris):
+    """
+    Rota la página para que las líneas de texto queden horizontales.
+
+    Args:
+        gris (np.ndarray): Página en escala de grises.
+
+    Returns:
+        np.ndarray: Página enderezada (o la misma si la inclinación es despreciable).
+    """
+    angulo = estimar_inclinacion(gris)
+    if abs(angulo) < INCLINACION_MINIMA:
+        return gris
+    return _rotar(gris, angulo)
+
+
+def binarizar(gris, dpi):
+    """
+    Binariza con umbral adaptativo gaussiano, que tolera sombras y fondos no uniformes de escaneos
+    mejor que un umbral global.
+
+    Args:
+        gris (np.ndarray): Página en escala de grises.
+        dpi (int): Resolución de la imagen, para que el vecindario cubra unas pocas letras.
+
+    Returns:
+        np.ndarray: Imagen binaria (0 y 255).
+    """
+    # Vecindario de ~0,15 pulgadas (impar, como exige OpenCV)
+    bloque = max(3, int(dpi * 0.15) | 1)
+    return cv2.adaptiveThreshold(gris, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, bloque, 15)
+
+
+@cronometrado('preprocesado')
+def preprocesar_para_ocr(imagen_cv, opciones, dpi_origen):
+    """
+    Prepara una página para Tesseract según las opciones del proveedor.
+
+    Args:
+        imagen_cv (np.ndarray): Página en formato OpenCV (escala de grises o BGR).
+        opciones (dict | None): {'dpi': int | None, 'enderezar': bool, 'binarizar': bool}
+            (ver utils/plantillas.py). None deja la imagen como está.
+        dpi_origen (int): Resolución con la que se rasterizó la página.
+
+    Returns:
+        np.ndarray: Imagen para el OCR.
+    """
+    if not opciones:
+        return imagen_cv
+    gris = a_escala_de_grises(imagen_cv)
+    gris = reducir_resolucion(gris, dpi_origen, opciones.get('dpi'))
+    dpi = min(dpi_origen, opciones.get('dpi') or dpi_origen)
+    if opciones.get('enderezar'):
+        gris = enderezar(gris)
+    if opciones.get('binarizar'):
+        gris = binarizar(gris, dpi)
+    return gris
@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import numpy as np
+
+
+class FacturaDuplicada(Exception):
+    """
+    La factura tiene un código de barras que ya está cargado en la base.
+    """
+
+    def __init__(self, codigo_barra):
+        super().__init__(f"La factura con código {codigo_barra} ya fue cargada previamente.")
+        self.codigo_barra = codigo_barra
+
+
+def huella_codigo(codigo_barra):
+    """
+    Resume un código de barras en un entero de 64 bits (estable entre procesos, a diferencia de hash()).
+    """
+    return int.from_bytes(hashlib.blake2b(codigo_barra.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class Referencias:
+    """
+    Datos de referencia cargados una vez por proceso: la tabla Entidades y el conjunto de códigos
+    de barras que ya existen en Facturas.
+
+    Los códigos se guardan como huellas de 64 bits en un arreglo ordenado de numpy (8 bytes por
+    factura, búsqueda binaria) más un set con los que se agregan después de la carga. La
+    probabilidad de que una huella coincida por azar es despreciable (del orden de 1e-13 con un
+    millón de facturas), y la restricción UNIQUE de la base sigue siendo la que decide al insertar:
+    el índice solo sirve para descartar duplicados antes del OCR y evitar consultas por fila.
+    """
+
+    # Cantidad de códigos agregados a partir de la cual se pasan al arreglo ordenado
+    MAXIMO_PENDIENTES = 10000
+
+    def __init__(self):
+        self.entidades = {}
+        self.entidades_por_cuit = {}
+        self.cargadas = False
+        self._base = np.empty(0, dtype=np.uint64)
+        self._nuevas = set()
+        self._lock = threading.Lock()
+
+    def cargar(self, conn, tamano_bloque=50000):
+        """
+        Lee Entidades y los códigos de barras existentes.
+
+        Args:
+            conn: Conexión a la base de datos.
+            tamano_bloque (int): Filas que se leen por cada fetchmany.
+        """
+        cursor = conn.cursor()
+        try:
+            entidades = self._leer_entidades(cursor)
+            cursor.execute("SELECT codigo_barra FROM Facturas WHERE codigo_barra IS NOT NULL")
+            bloques = []
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    break
+                bloques.append(np.fromiter((huella_codigo(fila[0]) for fila in filas),
+                                           dtype=np.uint64, count=len(filas)))
+        finally:
+            cursor.close()
+
+        base = np.unique(np.concatenate(bloques)) if bloques else np.empty(0, dtype=np.uint64)
+        with self._lock:
+            self.entidades = entidades
+            self.entidades_por_cuit = {e['cuit']: e['id'] for e in entidades.values()}
+            self._base = base
+            self._nuevas = set()
+            self.cargadas = True
+
+    @staticmethod
+    def _leer_entidades(cursor):
+        cursor.execute("SELECT ID, nombre, cuit, condicion_iva FROM Entidades")
+        return {fila[0]: {'id': fila[0], 'nombre': fila[1], 'cuit': fila[2], 'condicion_iva': fila[3]}
+                for fila in cursor.fetchall()}
+
+    def entidad_por_cuit(self, cuit, cursor=None):
+        """
+        Args:
+            cuit (str): CUIT de la entidad.
+            cursor: Si se indica y las entidades todavía no se leyeron, se leen con este cursor
+                (una sola vez por proceso).
+
+        Returns:
+            int | None: ID de la entidad con ese CUIT, o None si no existe.
+        """
+        if not self.entidades and cursor is not None:
+            entidades = self._leer_entidades(cursor)
+            with self._lock:
+                self.entidades = entidades
+                self.entidades_por_cuit = {e['cuit']: e['id'] for e in entidades.values()}
+        return self.entidades_por_cuit.get(cuit)
+
+    def existe_codigo(self, codigo_barra):
+        """
+        Indica si el código de barras ya está cargado (siempre False si el índice no se cargó).
+        """
+        if not self.cargadas or not codigo_barra:
+            return False
+        huella = huella_codigo(codigo_barra)
+        if huella in self._nuevas:
+            return True
+        base = self._base
+        posicion = int(np.searchsorted(base, np.uint64(huella)))
+        return posicion < len(base) and int(base[posicion]) == huella
+
+    def agregar_codigos(self, codigos):
+        """
+        Agrega códigos recién insertados (o que la base informó como existentes).
+        """
+        if not self.cargadas:
+            return
+        with self._lock:
+            self._nuevas.update(huella_codigo(codigo) for codigo in codigos if codigo)
+            if len(self._nuevas) >= self.MAXIMO_PENDIENTES:
+                nuevas = np.fromiter(self._nuevas, dtype=np.uint64, count=len(self._nuevas))
+                self._base = np.union1d(self._base, nuevas)
+                self._nuevas = set()
+
+    def exportar(self):
+        """
+        Devuelve el estado para copiarlo a otro proceso (ver `inicializar_referencias`).
+        """
+        with self._lock:
+            return {'entidades': self.entidades, 'base': self._base, 'nuevas': set(self._nuevas),
+                    'cargadas': self.cargadas}
+
+    def restaurar(self, estado):
+        with self._lock:
+            self.entidades = estado['entidades']
+            self.entidades_por_cuit = {e['cuit']: e['id'] for e in self.entidades.values()}
+            self._base = estado['base']
+            self._nuevas = estado['nuevas']
+            self.cargadas = estado['cargadas']
+
+
+# Referencias del proceso
+REFERENCIAS = Referencias()
+
+
+def inicializar_referencias(estado):
+    """
+    Inicializador de los procesos del pool: copia las referencias ya cargadas en el proceso principal.
+    """
+    REFERENCIAS.restaurar(estado)
@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Trabajo:
+    """
+    Un lote de archivos subidos que se procesa en segundo plano.
+
+    Los resultados se agregan a medida que terminan (cada uno con su 'indice'
+    dentro del lote) y quien consulta puede esperar a que lleguen nuevos.
+    """
+
+    def __init__(self, total, cuil=None):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.cuil = cuil
+        self.resultados = []
+        self.ultimo_acceso = time.monotonic()
+        self._condicion = threading.Condition()
+
+    @property
+    def terminado(self):
+        return len(self.resultados) >= self.total
+
+    def agregar(self, indice, resultado):
+        """
+        Registra el resultado de un archivo y despierta a quienes estén esperando.
+
+        Args:
+            indice (int): Posición del archivo dentro del lote.
+            resultado (dict): Resultado con 'archivo' y 'datos' o 'error'.
+        """
+        with self._condicion:
+            self.resultados.append(dict(resultado, indice=indice))
+            self._condicion.notify_all()
+
+    def esperar_nuevos(self, ya_recibidos, timeout=15):
+        """
+        Espera hasta que haya resultados posteriores a los ya recibidos.
+
+        Args:
+            ya_recibidos (int): Cantidad de resultados que el consumidor ya tiene.
+            timeout (float): Segundos máximos de espera.
+
+        Returns:
+            list: Resultados nuevos (puede estar vacía si venció el tiempo).
+        """
+        with self._condicion:
+            self._condicion.wait_for(
+                lambda: len(self.resultados) > ya_recibidos or self.terminado, timeout
+            )
+            return list(self.resultados[ya_recibidos:])
+
+    def resultados_ordenados(self):
+        """
+        Returns:
+            list: Resultados en el mismo orden en que se subieron los archivos.
+        """
+        with self._condicion:
+            return sorted(self.resultados, key=lambda r: r['indice'])
+
+    def estado(self):
+        """
+        Returns:
+            dict: Resumen del avance del trabajo.
+        """
+        with self._condicion:
+            return {
+                'id': self.id,
+                'total': self.total,
+                'procesados': len(self.resultados),
+                'terminado': self.terminado,
+                'resultados': sorted(self.resultados, key=lambda r: r['indice']),
+            }
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos atendida por un pool de hilos en segundo plano.
+
+    El OCR y la rasterización corren en procesos externos (tesseract, poppler),
+    así que los hilos alcanzan para procesar varios archivos a la vez.
+    Si se indica una función `escribir`, los resultados sin error pasan por una
+    única etapa de escritura que los agrupa en lotes (por ejemplo, para
+    insertarlos en la base con un solo viaje) antes de publicarse.
+    Los trabajos viven en la memoria del proceso del servidor (la sesión solo
+    guarda el id): un trabajo terminado se descarta cuando pasan `ttl` segundos
+    sin consultarlo, o antes si hay más de `maximo_trabajos` guardados.
+    """
+
+    def __init__(self, max_workers=4, escribir=None, tamano_lote=50, ttl=3600, maximo_trabajos=200):
+        """
+        Args:
+            max_workers (int): Cantidad de archivos que se procesan a la vez.
+            escribir (callable): Recibe una lista de resultados y devuelve la
+                lista de resultados finales en el mismo orden.
+            tamano_lote (int): Máximo de resultados por llamada a `escribir`.
+            ttl (float): Segundos que se guarda un trabajo terminado desde la última consulta.
+            maximo_trabajos (int): Cantidad de trabajos guardados a partir de la cual se
+                descartan los terminados consultados hace más tiempo.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='facturai')
+        # Ordenados del consultado hace más tiempo al más reciente
+        self._trabajos = OrderedDict()
+        self._ttl = ttl
+        self._maximo_trabajos = maximo_trabajos
+        self._lock = threading.Lock()
+        self._escribir = escribir
+        self._tamano_lote = tamano_lote
+        if escribir:
+            self._pendientes = queue.Queue()
+            threading.Thread(target=self._escritor, name='facturai-escritor', daemon=True).start()
+
+    def encolar(self, tareas, procesar, cuil=None):
+        """
+        Crea un trabajo y encola una tarea por archivo.
+
+        Args:
+            tareas (list): Argumentos de cada tarea. Si un elemento es un dict con
+                'error', se registra directamente como resultado sin procesarse.
+            procesar (callable): Función que recibe la tarea y devuelve el resultado.
+            cuil (str): CUIL asociado al lote.
+
+        Returns:
+            Trabajo: Trabajo creado.
+        """
+        trabajo = Trabajo(len(tareas), cuil)
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+            self._purgar()
+
+        for indice, tarea in enumerate(tareas):
+            if isinstance(tarea, dict) and 'error' in tarea:
+                trabajo.agregar(indice, tarea)
+            else:
+                self._executor.submit(self._ejecutar, trabajo, indice, procesar, tarea)
+        return trabajo
+
+    def obtener(self, trabajo_id):
+        """
+        Args:
+            trabajo_id (str): Id devuelto al encolar.
+
+        Returns:
+            Trabajo | None: Trabajo, o None si no existe o ya se descartó.
+        """
+        with self._lock:
+            self._purgar()
+            trabajo = self._trabajos.get(trabajo_id)
+            if trabajo:
+                trabajo.ultimo_acceso = time.monotonic()
+                self._trabajos.move_to_end(trabajo_id)
+            return trabajo
+
+    def _purgar(self):
+        """
+        Descarta los trabajos terminados vencidos y, si sobran, los terminados consultados hace más
+        tiempo. Los trabajos en curso nunca se descartan. Se llama con el lock tomado.
+        """
+        ahora = time.monotonic()
+        vencidos = [trabajo_id for trabajo_id, trabajo in self._trabajos.items()
+                    if trabajo.terminado and ahora - trabajo.ultimo_acceso > self._ttl]
+        for trabajo_id in vencidos:
+            del self._trabajos[trabajo_id]
+
+        exceso = len(self._trabajos) - self._maximo_trabajos
+        if exceso > 0:
+            terminados = [trabajo_id for trabajo_id, trabajo in self._trabajos.items() if trabajo.terminado]
+            for trabajo_id in terminados[:exceso]:
+                del self._trabajos[trabajo_id]
+
+    def _ejecutar(self, trabajo, indice, procesar, tarea):
+        try:
+            resultado = procesar(tarea)
+        except Exception as e:
+            # La función de procesamiento debería informar sus propios errores, pero nunca dejamos
+            # un trabajo incompleto por una excepción inesperada
+            resultado = {'archivo': str(tarea), 'error': str(e)}
+        if self._escribir and 'error' not in resultado:
+            self._pendientes.put((trabajo, indice, resultado))
+        else:
+            trabajo.agregar(indice, resultado)
+
+    def _escritor(self):
+        while True:
+            # Esperamos el primer resultado y sumamos al lote todos los que ya estén listos
+            lote = [self._pendientes.get()]
+            while len(lote) < self._tamano_lote:
+                try:
+                    lote.append(self._pendientes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                finales = self._escribir([resultado for _, _, resultado in lote])
+            except Exception as e:
+                finales = [{'archivo': resultado.get('archivo'), 'error': str(e)} for _, _, resultado in lote]
+            for (trabajo, indice, _), final in zip(lote, finales):
+                trabajo.agregar(indice, final)